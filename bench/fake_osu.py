@@ -0,0 +1,184 @@
+import asyncio
+import copy
+import json
+import os
+import random
+from collections import Counter
+
+from aiohttp import web
+
+# 벤치마크용 가짜 osu! 서버 (토큰 발급, API v2 일부, /osu/{id} .osu 파일)
+# bench/fixtures의 기록된 응답을 유저/비트맵 ID만 바꿔서 돌려주고, 요청마다 지연 시간을 넣는다.
+# 외부 네트워크 없이 127.0.0.1에서만 동작하므로 CI에서도 돌릴 수 있다.
+#   server = FakeOsuServer(latency=0.08, jitter=0.04)
+#   base_url = await server.start()
+#   ...
+#   print(server.requests)   # 경로별 요청 수
+#   await server.close()
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def _load_json(name):
+    with open(os.path.join(FIXTURES_DIR, name), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _load_bytes(name):
+    with open(os.path.join(FIXTURES_DIR, name), "rb") as f:
+        return f.read()
+
+
+class FakeOsuServer:
+    def __init__(self, latency=0.05, jitter=0.02, beatmaps=200, seed=0, osu_file_delay=0.0, osu_file_error_rate=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.beatmaps = beatmaps
+        # 원본 .osu 다운로드만 느리게/실패하게 (미러 /mirror/osu/{id}는 영향 없음)
+        self.osu_file_delay = osu_file_delay
+        self.osu_file_error_rate = osu_file_error_rate
+        self.random = random.Random(seed)
+
+        self.user_fixture = _load_json("user.json")
+        self.score_fixture = _load_json("score.json")
+        self.beatmap_file = _load_bytes("beatmap.osu")
+
+        self.requests = Counter()
+        self.bytes_sent = 0
+        self._runner = None
+
+    async def start(self, host="127.0.0.1", port=0):
+        app = web.Application()
+        app.router.add_post("/oauth/token", self.token)
+        app.router.add_get("/api/v2/users/{user}/scores/{type}", self.user_scores)
+        app.router.add_get("/api/v2/users/{user}/{mode}", self.user)
+        app.router.add_get("/api/v2/users/{user}/", self.user)
+        app.router.add_get("/api/v2/users", self.users)
+        app.router.add_get("/api/v2/beatmaps/{beatmap}/scores/users/{user}", self.beatmap_user_score)
+        app.router.add_get("/api/v2/beatmaps/lookup", self.beatmap)
+        app.router.add_get("/osu/{beatmap_id}", self.osu_file)
+        app.router.add_get("/mirror/osu/{beatmap_id}", self.mirror_osu_file)
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{port}"
+
+    async def close(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def _delay(self, route):
+        self.requests[route] += 1
+        await asyncio.sleep(self.latency + self.random.uniform(0, self.jitter))
+
+    # ------------------------------------------
+    # 응답 만들기 (ID만 바꾼 fixture 복사본)
+    # ------------------------------------------
+    def make_user(self, user_id):
+        user = copy.deepcopy(self.user_fixture)
+        user["id"] = user_id
+        user["username"] = f"player{user_id}"
+        user["avatar_url"] = f"https://a.ppy.sh/{user_id}"
+        stats = user["statistics"]
+        stats["pp"] = round(1000 + user_id % 9000 + 0.5, 2)
+        stats["global_rank"] = 1 + user_id * 7
+        stats["play_count"] = 1000 + user_id * 3
+        return user
+
+    def make_score(self, user_id, beatmap_id, index=0):
+        score = copy.deepcopy(self.score_fixture)
+        score["id"] = user_id * 1000 + index
+        score["user_id"] = user_id
+        score["user"].update(id=user_id, username=f"player{user_id}", avatar_url=f"https://a.ppy.sh/{user_id}")
+        score["beatmap"]["id"] = beatmap_id
+        score["beatmap"]["url"] = f"https://osu.ppy.sh/beatmaps/{beatmap_id}"
+        # 절반 정도는 FC (맵 다운로드 없이 끝나는 경로), 나머지는 미스가 있는 기록
+        if (user_id + index) % 2 == 0:
+            score["statistics"]["miss"] = 0
+            score["max_combo"] = 897
+        score["pp"] = round(max(1.0, score["pp"] - index * 3.1), 2)
+        return score
+
+    def make_beatmap(self, beatmap_id):
+        beatmap = copy.deepcopy(self.score_fixture["beatmap"])
+        beatmap.update(
+            id=beatmap_id, url=f"https://osu.ppy.sh/beatmaps/{beatmap_id}", max_combo=897,
+            convert=False, is_scoreable=True, mode_int=0, passcount=1000, playcount=5000, ranked=1,
+            last_updated="2020-01-01T00:00:00+00:00", deleted_at=None, user_id=2,
+        )
+        beatmap["beatmapset"] = copy.deepcopy(self.score_fixture["beatmapset"])
+        return beatmap
+
+    def _user_id(self, value):
+        if value.isdigit():
+            return int(value)
+        if value.startswith("player") and value[6:].isdigit():
+            return int(value[6:])
+        return None
+
+    # ------------------------------------------
+    # 경로
+    # ------------------------------------------
+    async def token(self, request):
+        await self._delay("token")
+        return web.json_response({"token_type": "Bearer", "expires_in": 86400, "access_token": "bench-token"})
+
+    async def user(self, request):
+        await self._delay("user")
+        user_id = self._user_id(request.match_info["user"])
+        if user_id is None:
+            return web.json_response({"error": None}, status=404)
+        return web.json_response(self.make_user(user_id))
+
+    async def users(self, request):
+        await self._delay("users")
+        users = []
+        for value in request.query.getall("ids[]", []):
+            user = self.make_user(int(value))
+            user["statistics_rulesets"] = {"osu": user.pop("statistics")}
+            users.append(user)
+        return web.json_response({"users": users})
+
+    async def user_scores(self, request):
+        score_type = request.match_info["type"]
+        await self._delay(f"scores_{score_type}")
+        user_id = self._user_id(request.match_info["user"])
+        if user_id is None:
+            return web.json_response({"error": None}, status=404)
+
+        limit = int(request.query.get("limit", "100" if score_type == "best" else "1"))
+        offset = int(request.query.get("offset", "0"))
+        scores = [
+            self.make_score(user_id, 1 + (user_id * 31 + i) % self.beatmaps, i)
+            for i in range(offset, offset + limit)
+        ]
+        return web.json_response(scores)
+
+    async def beatmap(self, request):
+        await self._delay("beatmap")
+        return web.json_response(self.make_beatmap(int(request.query["id"])))
+
+    # 5명 중 1명 꼴로 이 맵에 기록이 없다 (404)
+    async def beatmap_user_score(self, request):
+        await self._delay("beatmap_user_score")
+        beatmap_id = int(request.match_info["beatmap"])
+        user_id = self._user_id(request.match_info["user"])
+        if user_id is None or (user_id + beatmap_id) % 5 == 0:
+            return web.json_response({"error": None}, status=404)
+        return web.json_response({"position": 1 + user_id % 50, "score": self.make_score(user_id, beatmap_id, beatmap_id % 7)})
+
+    async def osu_file(self, request):
+        await self._delay("osu_file")
+        if self.osu_file_delay:
+            await asyncio.sleep(self.random.uniform(0, self.osu_file_delay))
+        if self.random.random() < self.osu_file_error_rate:
+            return web.Response(status=503)
+        self.bytes_sent += len(self.beatmap_file)
+        return web.Response(body=self.beatmap_file, content_type="text/plain")
+
+    async def mirror_osu_file(self, request):
+        await self._delay("mirror_osu_file")
+        self.bytes_sent += len(self.beatmap_file)
+        return web.Response(body=self.beatmap_file, content_type="text/plain")
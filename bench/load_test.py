@@ -0,0 +1,283 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 가짜 서버는 http라서 OAuth 라이브러리의 https 강제를 끈다 (벤치마크 프로세스 안에서만)
+os.environ.setdefault("OAUTHLIB_INSECURE_TRANSPORT", "1")
+
+import aiohttp
+
+import cogs.osu as osu_cog
+import utils.osu_api as osu_api
+import utils.osu_auth as osu_auth
+from bench.fake_osu import FakeOsuServer
+from utils.beatmap_cache import BeatmapCache
+from utils.difficulty_cache import DifficultyCache
+from utils.metrics import metrics
+from utils.osu_api import AsyncOsuApi
+from utils.osu_auth import OsuAuth
+from utils.pp_service import PPService
+from utils.rate_limit import RateLimiter
+from utils.storage import Storage
+
+# Osu 코그 부하 테스트
+# 로컬 가짜 osu! 서버(bench/fake_osu.py)를 띄우고, 가짜 디스코드 컨텍스트로 명령어를 동시에 실행해서
+# 명령어별 처리량, 지연 시간 분포(완료/첫 응답), 명령어 한 번당 API 호출/맵 다운로드 수를 출력한다. 네트워크는 쓰지 않는다.
+#   python -m bench.load_test --commands osu recent --requests 500 --concurrency 50 --latency-ms 80
+#   python -m bench.load_test --rpm 60 --burst 10      # 운영과 같은 API 예산으로
+#   python -m bench.load_test --json result.json       # 결과를 파일로 (회귀 비교용)
+#   python -m bench.load_test --commands recent --osu-file-delay-ms 8000 --mirror   # 원본 .osu 서버가 느릴 때
+COMMANDS = ("osu", "recent", "link", "top", "compare")
+ERROR_MARKERS = ("오류 발생", "찾을 수 없습니다", "연결할 수 없습니다", "연동된 계정이 없습니다")
+
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+# ------------------------------------------
+# 가짜 디스코드 쪽
+# ------------------------------------------
+class FakeMessage:
+    def __init__(self, ctx, content, embed):
+        self.ctx = ctx
+        self.content = content
+        self.embed = embed
+
+    async def edit(self, content=None, embed=None, **kwargs):
+        await self.ctx.discord_delay()
+        self.ctx.edits += 1
+        self.content = content if content is not None else self.content
+        self.embed = embed if embed is not None else self.embed
+
+
+class FakeContext:
+    def __init__(self, author_id, guild_id, discord_latency):
+        self.author = SimpleNamespace(id=author_id, display_name=f"member{author_id}", display_avatar=SimpleNamespace(url="https://cdn.discordapp.com/embed/avatars/0.png"))
+        self.guild = SimpleNamespace(id=guild_id)
+        self.channel = SimpleNamespace(id=guild_id, mention=f"<#{guild_id}>")
+        self.message = None
+        self.discord_latency = discord_latency
+        self.messages = []
+        self.edits = 0
+        self.first_response_at = None
+
+    @property
+    def followup(self):
+        return self
+
+    async def discord_delay(self):
+        if self.discord_latency:
+            await asyncio.sleep(self.discord_latency)
+
+    async def defer(self):
+        await self.discord_delay()
+
+    async def send(self, content=None, embed=None, **kwargs):
+        await self.discord_delay()
+        if self.first_response_at is None:
+            self.first_response_at = time.perf_counter()
+        message = FakeMessage(self, content, embed)
+        self.messages.append(message)
+        return message
+
+    @property
+    def failed(self):
+        if not self.messages:
+            return True
+        return any(message.content and any(marker in message.content for marker in ERROR_MARKERS) for message in self.messages)
+
+
+# 코그가 쓰는 봇 속성만 갖춘 봇 (디스코드에 접속하지 않음)
+class BenchBot:
+    def __init__(self, tmp, args):
+        auth = OsuAuth("bench", "bench", path=os.path.join(tmp, "token.json"))
+        self.osu_api = AsyncOsuApi(auth, limiter=RateLimiter(per_minute=args.rpm, burst=args.burst))
+        self.storage = Storage(os.path.join(tmp, "bench.db"))
+        self.beatmap_cache = BeatmapCache(os.path.join(tmp, "beatmap_cache"))
+        self.difficulty_cache = DifficultyCache(os.path.join(tmp, "bench.db"))
+        self.pp_service = PPService(workers=args.pp_workers)
+        self.http_session = None
+
+    # 추적 루프는 부하 테스트에서 돌리지 않는다
+    async def wait_until_ready(self):
+        await asyncio.Event().wait()
+
+    def get_channel(self, channel_id):
+        return None
+
+    async def close(self):
+        self.osu_api.close()
+        await self.http_session.close()
+        self.difficulty_cache.close()
+        self.pp_service.close()
+        self.storage.close()
+
+
+# ------------------------------------------
+# 부하 실행
+# ------------------------------------------
+async def run_command(cog, name, ctx, username, rng, args):
+    if name == "osu":
+        await osu_cog.Osu.osu.callback(cog, ctx, username)
+    elif name == "recent":
+        await osu_cog.Osu.recent.callback(cog, ctx, username)
+    elif name == "top":
+        await osu_cog.Osu.top.callback(cog, ctx, username)
+    elif name == "compare":
+        # 연동된 멤버 멘션과 닉네임을 섞어서 3명
+        players = [f"<@{rng.randint(1, args.users)}>" if rng.random() < args.linked_ratio else f"player{rng.randint(1, args.users)}" for _ in range(3)]
+        await osu_cog.Osu.compare.callback(cog, ctx, str(rng.randint(1, args.beatmaps)), players=" ".join(players))
+    elif name == "link":
+        await osu_cog.Osu.link.callback(cog, ctx, username or f"player{ctx.author.id}", "osu")
+
+
+async def run_phase(cog, server, name, args, rng):
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies, first_responses, failures = [], [], 0
+    requests_before = server.requests.copy()
+    rejected_before = sum(metrics.counter_values("admission_rejected").values())
+
+    async def one():
+        nonlocal failures
+        user_id = rng.randint(1, args.users)
+        # 연동된 유저는 닉네임 없이, 나머지는 닉네임으로 조회
+        username = None if rng.random() < args.linked_ratio else f"player{user_id}"
+        ctx = FakeContext(user_id, 1 + user_id % args.guilds, args.discord_latency_ms / 1000)
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await run_command(cog, name, ctx, username, rng, args)
+            except Exception as e:
+                print(f"{name} 예외: {e!r}")
+                failures += 1
+                return
+            latencies.append(time.perf_counter() - start)
+            # 사용자가 처음 응답을 본 시점 (먼저 보내고 나중에 수정하는 명령어는 완료보다 빠르다)
+            first_responses.append((ctx.first_response_at or time.perf_counter()) - start)
+            if ctx.failed:
+                failures += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one() for _ in range(args.requests)])
+    elapsed = time.perf_counter() - start
+
+    calls = server.requests - requests_before
+    calls.pop("token", None)
+    latencies.sort()
+    first_responses.sort()
+    api_calls = sum(count for route, count in calls.items() if route not in ("osu_file", "mirror_osu_file"))
+    return {
+        "command": name,
+        "requests": args.requests,
+        "failures": failures,
+        "elapsed": elapsed,
+        "throughput": args.requests / elapsed,
+        "p50": percentile(latencies, 0.50) if latencies else 0.0,
+        "p95": percentile(latencies, 0.95) if latencies else 0.0,
+        "p99": percentile(latencies, 0.99) if latencies else 0.0,
+        "max": latencies[-1] if latencies else 0.0,
+        "first_p50": percentile(first_responses, 0.50) if first_responses else 0.0,
+        "first_p95": percentile(first_responses, 0.95) if first_responses else 0.0,
+        # 입장 관리에서 바로 거절된 수 (바쁨/중복 안내를 받은 요청, 실패로 세지 않음)
+        "rejected": sum(metrics.counter_values("admission_rejected").values()) - rejected_before,
+        "api_per_command": api_calls / args.requests,
+        "downloads_per_command": (calls.get("osu_file", 0) + calls.get("mirror_osu_file", 0)) / args.requests,
+        "routes": dict(calls),
+    }
+
+
+async def seed_accounts(storage, args):
+    # 모든 가짜 멤버를 같은 번호의 osu! 유저에 연동 (discord_id == osu_user_id)
+    def seed(conn):
+        conn.executemany(
+            "INSERT OR REPLACE INTO users (discord_id, osu_username, osu_user_id, mode) VALUES (?, ?, ?, 'osu')",
+            [(i, f"player{i}", i) for i in range(1, args.users + 1)],
+        )
+        conn.commit()
+    await storage.run(seed, storage.conn)
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    server = FakeOsuServer(
+        latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000, beatmaps=args.beatmaps, seed=args.seed,
+        osu_file_delay=args.osu_file_delay_ms / 1000, osu_file_error_rate=args.osu_file_error_rate,
+    )
+    base_url = await server.start()
+
+    # 봇이 osu.ppy.sh 대신 가짜 서버를 보게 한다
+    osu_auth.OSU_TOKEN_URL = f"{base_url}/oauth/token"
+    osu_api.OSU_API_URL = f"{base_url}/api/v2"
+    osu_cog.OSU_BEATMAP_URL = base_url + "/osu/{id}"
+    osu_cog.OSU_BEATMAP_MIRROR_URL = base_url + "/mirror/osu/{id}" if args.mirror else ""
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        bot = BenchBot(tmp, args)
+        bot.http_session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=args.http_pool))
+        await seed_accounts(bot.storage, args)
+        cog = osu_cog.Osu(bot)
+        try:
+            for name in args.commands:
+                results.append(await run_phase(cog, server, name, args, rng))
+        finally:
+            cog.track_loop.cancel()
+            cog.history_loop.cancel()
+            await bot.close()
+            await server.close()
+
+    print(f"users: {args.users}  beatmaps: {args.beatmaps}  concurrency: {args.concurrency}  "
+          f"osu! latency: {args.latency_ms:.0f}±{args.jitter_ms:.0f}ms  discord latency: {args.discord_latency_ms:.0f}ms")
+    print(f"{'command':<10}{'reqs':>7}{'fail':>6}{'rej':>6}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}{'1st p50':>9}{'1st p95':>9}{'api/cmd':>9}{'maps/cmd':>10}")
+    for r in results:
+        print(
+            f"{r['command']:<10}{r['requests']:>7}{r['failures']:>6}{r['rejected']:>6}{r['throughput']:>9.1f}"
+            f"{r['p50'] * 1000:>7.0f}ms{r['p95'] * 1000:>7.0f}ms{r['p99'] * 1000:>7.0f}ms{r['max'] * 1000:>7.0f}ms"
+            f"{r['first_p50'] * 1000:>7.0f}ms{r['first_p95'] * 1000:>7.0f}ms"
+            f"{r['api_per_command']:>9.2f}{r['downloads_per_command']:>10.2f}"
+        )
+    downloads = metrics.counter_values("beatmap_downloads")
+    if downloads:
+        print("다운로드: " + "  ".join(f"{labels} {count}" for labels, count in downloads.items())
+              + f"  헤지 {metrics.counter('beatmap_download_hedges')}  건너뜀 {metrics.counter('beatmap_download_skipped')}")
+    rosu = metrics.summary("rosu_calc_seconds").get("")
+    if rosu:
+        print(f"rosu 계산: {rosu['count']}회  p50 {rosu['p50'] * 1000:.1f}ms  p95 {rosu['p95'] * 1000:.1f}ms")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2, ensure_ascii=False)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Osu 코그 부하 테스트 (가짜 osu! 서버)")
+    parser.add_argument("--commands", nargs="+", choices=COMMANDS, default=["osu", "recent"])
+    parser.add_argument("--requests", type=int, default=300, help="명령어별 실행 횟수")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--users", type=int, default=200, help="가짜 osu! 유저 수 (유저가 적을수록 캐시 적중이 많다)")
+    parser.add_argument("--beatmaps", type=int, default=100, help="가짜 비트맵 수")
+    parser.add_argument("--guilds", type=int, default=5)
+    parser.add_argument("--linked-ratio", type=float, default=0.7, help="닉네임 없이(연동 계정으로) 부르는 비율")
+    parser.add_argument("--latency-ms", type=float, default=80)
+    parser.add_argument("--jitter-ms", type=float, default=40)
+    parser.add_argument("--discord-latency-ms", type=float, default=0)
+    parser.add_argument("--osu-file-delay-ms", type=float, default=0, help="원본 .osu 다운로드에만 더하는 최대 지연 (균등 분포)")
+    parser.add_argument("--osu-file-error-rate", type=float, default=0, help="원본 .osu 다운로드가 503으로 실패하는 비율")
+    parser.add_argument("--mirror", action="store_true", help="보조 .osu 미러 사용")
+    parser.add_argument("--rpm", type=int, default=60000, help="osu! API 분당 요청 예산 (기본값은 사실상 제한 없음)")
+    parser.add_argument("--burst", type=int, default=1000)
+    parser.add_argument("--pp-workers", type=int, default=2)
+    parser.add_argument("--http-pool", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="결과를 저장할 JSON 파일 경로")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,76 @@
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.storage import Storage
+
+# Storage 계정 조회 벤치마크
+# 동시에 여러 명령어가 get_account를 부르는 상황(가끔 link로 쓰기 포함)을 흉내내서
+# 처리량과 지연 시간 분포를 출력한다.
+#   python -m bench.storage_bench --users 5000 --concurrency 200 --ops 50000
+
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def worker(storage, ops, user_ids, write_ratio, latencies):
+    for _ in range(ops):
+        discord_id = random.choice(user_ids)
+        start = time.perf_counter()
+        if random.random() < write_ratio:
+            await storage.set_account(discord_id, discord_id + 1000, f"user{discord_id}", "osu")
+        else:
+            await storage.get_account(discord_id)
+        latencies.append(time.perf_counter() - start)
+
+
+async def run(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = Storage(os.path.join(tmp, "bench.db"))
+
+        # 연동된 유저 미리 넣어두기 (절반만 연동, 나머지는 미연동 조회)
+        def seed(conn):
+            conn.executemany(
+                "INSERT INTO users (discord_id, osu_username, osu_user_id, mode) VALUES (?, ?, ?, 'osu')",
+                [(i, f"user{i}", i + 1000) for i in range(0, args.users, 2)],
+            )
+            conn.commit()
+        await storage.run(seed, storage.conn)
+
+        user_ids = list(range(args.users))
+        per_worker = args.ops // args.concurrency
+        latencies = []
+
+        start = time.perf_counter()
+        await asyncio.gather(*[
+            worker(storage, per_worker, user_ids, args.write_ratio, latencies)
+            for _ in range(args.concurrency)
+        ])
+        elapsed = time.perf_counter() - start
+        storage.close()
+
+    latencies.sort()
+    print(f"ops: {len(latencies)}  concurrency: {args.concurrency}  users: {args.users}")
+    print(f"throughput: {len(latencies) / elapsed:,.0f} ops/s")
+    print(
+        f"latency  p50: {percentile(latencies, 0.50) * 1000:.3f}ms  "
+        f"p95: {percentile(latencies, 0.95) * 1000:.3f}ms  "
+        f"p99: {percentile(latencies, 0.99) * 1000:.3f}ms  "
+        f"max: {latencies[-1] * 1000:.3f}ms"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Storage 계정 조회 벤치마크")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--ops", type=int, default=50000)
+    parser.add_argument("--write-ratio", type=float, default=0.01)
+    asyncio.run(run(parser.parse_args()))
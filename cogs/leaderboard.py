@@ -0,0 +1,157 @@
+import discord
+import asyncio
+import os
+import time
+from discord import app_commands
+from discord.ext import commands
+
+from utils.osu_common import MODES, today
+from utils.paged_view import PagedView
+from utils.storage import LEADERBOARD_ORDERS
+
+# 스냅샷이 이보다 오래됐으면 다시 받는다 (초)
+LEADERBOARD_TTL = int(os.getenv("LEADERBOARD_TTL", "600"))
+USERS_PER_CALL = 50
+# 예전 연동 계정이 이 서버 멤버인지 한 번에 확인하는 수 (멤버 인텐트가 있으면 query_members 한 번, 없으면 fetch_member 동시 실행)
+MEMBER_LOOKUP_CHUNK = 50
+PAGE_SIZE = 10
+SORT_NAMES = {"pp": "PP", "rank": "글로벌 랭킹", "accuracy": "정확도", "playcount": "플레이 횟수"}
+
+
+# 랭킹 페이지 넘기기 버튼 (페이지마다 DB 스냅샷에서 읽고, API는 다시 부르지 않음)
+class LeaderboardView(PagedView):
+    def __init__(self, storage, guild, mode, sort, total, author_id):
+        super().__init__(total, PAGE_SIZE, author_id)
+        self.storage = storage
+        self.guild = guild
+        self.mode = mode
+        self.sort = sort
+
+    async def render(self):
+        rows = await self.storage.leaderboard_page(self.guild.id, self.mode, self.sort, self.page * PAGE_SIZE, PAGE_SIZE)
+
+        lines = []
+        for i, (osu_user_id, username, pp, global_rank, accuracy, play_count, _) in enumerate(rows, self.page * PAGE_SIZE + 1):
+            g_rank = f"#{global_rank:,}" if global_rank else "Unranked"
+            lines.append(
+                f"**{i}.** [{username}](https://osu.ppy.sh/users/{osu_user_id}) │ "
+                f"**{pp or 0:,.0f}pp** │ `{g_rank}` │ {accuracy or 0:.2f}% │ {play_count or 0:,}회"
+            )
+
+        embed = discord.Embed(
+            title=f"{self.guild.name} 랭킹 ({SORT_NAMES[self.sort]}, {self.mode})",
+            description="\n".join(lines) if lines else "표시할 유저가 없습니다.",
+            color=0xff66aa,
+        )
+        oldest = min((row[6] for row in rows), default=time.time())
+        embed.set_footer(text=f"{self.page + 1}/{self.pages} 페이지 · {int((time.time() - oldest) // 60)}분 전 데이터")
+
+        return embed
+
+
+class Leaderboard(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+
+    # 서버 연결(guild_links)은 link나 명령어를 그 서버에서 쓸 때만 생기므로,
+    # 그 전에 연동한 계정은 서버마다 처음 랭킹을 볼 때 멤버인지 확인해서 채운다
+    async def backfill_guild_links(self, guild):
+        candidates = await self.bot.storage.guild_link_candidates(guild.id)
+        if candidates:
+            members = []
+            for i in range(0, len(candidates), MEMBER_LOOKUP_CHUNK):
+                members.extend(await self._find_members(guild, candidates[i:i + MEMBER_LOOKUP_CHUNK]))
+            await self.bot.storage.finish_guild_backfill(guild.id, members)
+            print(f"서버 연결 채우기 ({guild.id}): 연동 계정 {len(candidates)}개 중 멤버 {len(members)}명")
+
+        # 예전 스키마에서 넘어와 osu! ID가 없는 계정은 ID부터 채워야 랭킹에 들어간다
+        osu_cog = self.bot.get_cog("Osu")
+        unresolved = await self.bot.storage.guild_unresolved(guild.id)
+        if osu_cog and unresolved:
+            await asyncio.gather(*[osu_cog.get_linked_account(discord_id) for discord_id in unresolved])
+
+    async def _find_members(self, guild, discord_ids):
+        if self.bot.intents.members:
+            members = await guild.query_members(user_ids=discord_ids, limit=len(discord_ids), cache=False)
+            return [member.id for member in members]
+
+        async def is_member(discord_id):
+            if guild.get_member(discord_id):
+                return True
+            try:
+                await guild.fetch_member(discord_id)
+                return True
+            except discord.NotFound:
+                return False
+
+        found = await asyncio.gather(*[is_member(discord_id) for discord_id in discord_ids])
+        return [discord_id for discord_id, ok in zip(discord_ids, found) if ok]
+
+    # 오래된 스냅샷만 골라서 users([...])로 50명씩 한 번에 받아 저장
+    async def refresh_snapshots(self, osu_user_ids, mode):
+        now = time.time()
+        times = await self.bot.storage.snapshot_times(osu_user_ids, mode)
+        stale = [i for i in osu_user_ids if now - times.get(i, 0) > LEADERBOARD_TTL]
+        if not stale:
+            return len(times)
+
+        chunks = [stale[i:i + USERS_PER_CALL] for i in range(0, len(stale), USERS_PER_CALL)]
+        results = await asyncio.gather(*[self.bot.osu_api.users(chunk) for chunk in chunks], return_exceptions=True)
+
+        rows, history = [], []
+        day = today(now)
+        for result in results:
+            if isinstance(result, Exception):
+                print(f"랭킹 스냅샷 갱신 실패: {result}")
+                continue
+            for user in result:
+                stats = getattr(getattr(user, "statistics_rulesets", None), mode, None)
+                if stats is None:
+                    continue
+                rows.append((user.id, mode, user.username, stats.pp, stats.global_rank, stats.hit_accuracy, stats.play_count, now))
+                history.append((user.id, mode, day, stats.pp, stats.global_rank))
+
+        if rows:
+            await self.bot.storage.save_snapshots(rows)
+            # 받아온 김에 /progress 기록도 남긴다
+            await self.bot.storage.record_history(history)
+        return len(set(times) | {row[0] for row in rows})
+
+    # ==========================================
+    # 서버 랭킹 명령어 (/leaderboard)
+    # ==========================================
+    @commands.hybrid_command(name="leaderboard", aliases=['lb'], description="이 서버에 연동된 멤버들의 osu! 랭킹을 봅니다.")
+    @app_commands.describe(sort="정렬 기준 (pp, rank, accuracy, playcount)", mode="모드 (osu, taiko, fruits, mania)")
+    @commands.guild_only()
+    async def leaderboard(self, ctx, sort: str = "pp", mode: str = "osu"):
+        await ctx.defer()
+
+        if sort not in LEADERBOARD_ORDERS:
+            await ctx.send(f"정렬 기준은 {', '.join(LEADERBOARD_ORDERS)} 중 하나로 입력하세요.")
+            return
+        if mode not in MODES:
+            await ctx.send(f"모드는 {', '.join(MODES)} 중 하나로 입력하세요.")
+            return
+
+        try:
+            try:
+                await self.backfill_guild_links(ctx.guild)
+            except (discord.HTTPException, asyncio.TimeoutError) as e:
+                # 확인을 못 했으면 끝난 것으로 표시하지 않으므로 다음 랭킹 조회 때 다시 시도
+                print(f"서버 연결 채우기 실패 ({ctx.guild.id}): {e}")
+
+            osu_user_ids = await self.bot.storage.guild_accounts(ctx.guild.id)
+            if not osu_user_ids:
+                await ctx.send("이 서버에는 아직 계정을 연동한 멤버가 없습니다. `?link 닉네임`으로 연동하세요.")
+                return
+
+            total = await self.refresh_snapshots(osu_user_ids, mode)
+            view = LeaderboardView(self.bot.storage, ctx.guild, mode, sort, total, ctx.author.id)
+            await view.send(ctx)
+
+        except Exception as e:
+            await ctx.send(f"오류 발생: {e}")
+
+# Cog 로드 함수
+async def setup(bot):
+    await bot.add_cog(Leaderboard(bot))
@@ -1,55 +1,429 @@
-import discord
-import sqlite3
-import rosu_pp_py
 import aiohttp
+import discord
+import asyncio
+import io
 import os
+import re
+import time
+from collections import OrderedDict
 from discord import app_commands
-from discord.ext import commands
+from discord.ext import commands, tasks
+
+from utils.admission import CHANNEL_LIMIT, DUPLICATE, USER_LIMIT, AdmissionControl
+from utils.charts import can_render, render_progress
+from utils.circuit_breaker import CLOSED, CircuitBreaker
+from utils.metrics import metrics
+from utils.osu_auth import OsuUnavailable
+from utils.osu_common import MODES, today
+from utils.paged_view import PagedView
+from utils.profile_cache import ProfileCache
+from utils.singleflight import SingleFlight
+from utils.tracker import TRACKER_TICK_SECONDS, ScoreTracker
+
+# 이 기간(일)보다 오래된 PP/랭킹 기록은 주 단위로 줄인다
+HISTORY_FULL_DAYS = 365
+# .osu 파일 다운로드 주소 ({id}에 비트맵 ID)
+OSU_BEATMAP_URL = os.getenv("OSU_BEATMAP_URL", "https://osu.ppy.sh/osu/{id}")
+# 보조 .osu 미러 (같은 형식, 비워두면 사용 안 함)
+OSU_BEATMAP_MIRROR_URL = os.getenv("OSU_BEATMAP_MIRROR_URL", "")
+# .osu 요청 하나의 최대 시간 (초), 원본이 이 시간 안에 끝나지 않으면 미러에도 같이 요청 (헤지)
+BEATMAP_DOWNLOAD_TIMEOUT = float(os.getenv("BEATMAP_DOWNLOAD_TIMEOUT", "5"))
+BEATMAP_HEDGE_DELAY = float(os.getenv("BEATMAP_HEDGE_DELAY", "1"))
+# 연속 실패가 이만큼 쌓이면 이 시간(초) 동안 다운로드를 건너뛰고 API 값만으로 보여준다
+BEATMAP_BREAKER_FAILURES = int(os.getenv("BEATMAP_BREAKER_FAILURES", "5"))
+BEATMAP_BREAKER_RESET = float(os.getenv("BEATMAP_BREAKER_RESET", "30"))
+# osu! 토큰을 받을 수 없을 때 (키 미설정, osu! 서버 장애 등) 보여줄 안내
+OSU_UNAVAILABLE = "지금은 osu! 서버에 연결할 수 없습니다. 잠시 후 다시 시도해주세요."
+# 무거운 명령어가 입장 관리에서 거절됐을 때 안내 (나머지 사유는 BUSY)
+BUSY = "지금 요청이 많아 처리할 수 없습니다. 잠시 후 다시 시도해주세요."
+BUSY_MESSAGES = {
+    DUPLICATE: "같은 요청을 이미 처리하고 있습니다. 먼저 보낸 요청의 결과를 확인해주세요.",
+    USER_LIMIT: "처리 중인 요청이 많습니다. 앞의 요청이 끝난 뒤 다시 시도해주세요.",
+    CHANNEL_LIMIT: "이 채널에서 처리 중인 요청이 많습니다. 잠시 후 다시 시도해주세요.",
+}
+
+# rosu에 넘길 모드 비트값
+MOD_BITS = {"NF": 1, "EZ": 2, "TD": 4, "HD": 8, "HR": 16, "SD": 32, "DT": 64, "RX": 128, "HT": 256, "NC": 576, "FL": 1024, "SO": 4096}
+# If-FC PP 계산을 기다리는 최대 시간 (초). 넘으면 먼저 보낸 임베드에 '계산 불가'로 표시
+RECENT_PP_TIMEOUT = float(os.getenv("RECENT_PP_TIMEOUT", "8"))
+# /top: 베스트 기록 수, 한 번에 받는 맵/계산 수, 유저별 결과 캐시 크기, 페이지당 기록 수
+TOP_PLAYS_LIMIT = 100
+TOP_CONCURRENCY = int(os.getenv("TOP_CONCURRENCY", "8"))
+TOP_CACHE_SIZE = int(os.getenv("TOP_CACHE_SIZE", "256"))
+# If-FC PP를 계산하지 못한 기록이 섞인 /top 결과는 이 시간(초)만 재사용 (다운로드 실패, 대기열 가득 참 등)
+TOP_FAILED_TTL = int(os.getenv("TOP_FAILED_TTL", "60"))
+TOP_PAGE_SIZE = 5
+# /compare: 한 번에 비교할 수 있는 인원
+COMPARE_MAX_PLAYERS = 8
+# 비트맵 링크에서 비트맵 ID (osu.ppy.sh/b/75, /beatmaps/75, /beatmapsets/1#osu/75)
+BEATMAP_URL_PATTERN = re.compile(r"(?:/b/|/beatmaps/|#(?:osu|taiko|fruits|mania)/)(\d+)")
+
+# 기록에 적용된 모드 약어 목록 (예: ["HD", "DT"])
+def get_active_mods(score):
+    active_mods = []
+    if score.mods:
+        if isinstance(score.mods, list):
+            for m in score.mods:
+                if hasattr(m, 'acronym'): active_mods.append(str(m.acronym))
+                else: active_mods.append(str(m))
+        else:
+            active_mods = str(score.mods).split(" ")
+    return active_mods
+
+def get_mods_value(active_mods):
+    return sum(MOD_BITS.get(mod_name, 0) for mod_name in active_mods)
+
+# (300, 100, 50, 미스) 개수 (예전 count_* 형식과 레이저 great/ok/meh/miss 형식 모두)
+def get_hit_counts(statistics):
+    c300 = getattr(statistics, "count_300", getattr(statistics, "great", 0)) or 0
+    c100 = getattr(statistics, "count_100", getattr(statistics, "ok", 0)) or 0
+    c50  = getattr(statistics, "count_50",  getattr(statistics, "meh", 0)) or 0
+    miss = getattr(statistics, "count_miss", getattr(statistics, "miss", 0)) or 0
+    return c300, c100, c50, miss
+
+# 미스 없이 최대 콤보 근처면 FC로 본다 (최대 콤보를 모르면 미스만 본다)
+def is_full_combo(score, miss, max_combo):
+    if not max_combo:
+        return miss == 0
+    return miss == 0 and score.max_combo >= max_combo - 7
+
+# 베스트 기록 가중치 (n번째 기록은 0.95^n)
+PP_WEIGHTS = [0.95 ** i for i in range(TOP_PLAYS_LIMIT)]
+
+# 베스트 기록 PP의 가중 합 (보너스 PP 제외)
+def weighted_pp(pps):
+    return sum(pp * weight for pp, weight in zip(sorted(pps, reverse=True), PP_WEIGHTS))
+
+# 기록마다 FC였다면 가중 합계가 얼마나 오르는지 (play["total_gain"])
+def add_fc_gains(plays):
+    pps = [play["pp"] for play in plays]
+    total = weighted_pp(pps)
+    for i, play in enumerate(plays):
+        if play["if_fc_pp"] is None or play["if_fc_pp"] <= play["pp"]:
+            play["total_gain"] = 0.0
+            continue
+        pps[i] = play["if_fc_pp"]
+        play["total_gain"] = weighted_pp(pps) - total
+        pps[i] = play["pp"]
+    return total
+
+# 비트맵 ID 또는 링크 -> 비트맵 ID (알 수 없으면 None)
+def parse_beatmap_id(text):
+    text = text.strip("<>")
+    if text.isdigit():
+        return int(text)
+    match = BEATMAP_URL_PATTERN.search(text)
+    return int(match.group(1)) if match else None
+
+# "@a @b \"닉네임 띄어쓰기\"" -> ["<@..>", "<@..>", "닉네임 띄어쓰기"] (순서 유지, 중복 제거)
+def split_players(text):
+    if not text:
+        return []
+    names = [quoted or word for quoted, word in re.findall(r'"([^"]+)"|(\S+)', text)]
+    return list(dict.fromkeys(names))
+
+# /top 페이지 넘기기 버튼 (계산은 명령어에서 끝내두고 여기서는 그리기만)
+class TopView(PagedView):
+    def __init__(self, username, mode, plays, author_id):
+        super().__init__(len(plays), TOP_PAGE_SIZE, author_id)
+        self.username = username
+        self.mode = mode
+        self.plays = plays
+        self.total = weighted_pp([play["pp"] for play in plays])
+
+    async def render(self):
+        lines = []
+        start = self.page * TOP_PAGE_SIZE
+        for i, play in enumerate(self.plays[start:start + TOP_PAGE_SIZE], start + 1):
+            score = play["score"]
+            beatmap = score.beatmap
+            mods_str = " +" + "".join(play["mods"]) if play["mods"] else ""
+            combo = f"{score.max_combo:,}x/{play['max_combo']:,}x" if play["max_combo"] else f"{score.max_combo:,}x"
+            line = (
+                f"**{i}.** [{score.beatmapset.title} [{beatmap.version}]]({beatmap.url}){mods_str}\n"
+                f"**{play['pp']:.0f}pp** · {score.accuracy * 100:.2f}% · {combo} · {play['miss']} miss"
+            )
+            if play["if_fc_pp"] is None:
+                line += " · FC PP 계산 불가"
+            elif play["if_fc_pp"] > play["pp"] + 0.5:
+                line += f"\n➔ FC **{play['if_fc_pp']:.0f}pp** (+{play['if_fc_pp'] - play['pp']:.0f}pp, 합계 +{play['total_gain']:.1f}pp)"
+            else:
+                line += " · **FC**"
+            lines.append(line)
+
+        embed = discord.Embed(title=f"{self.username} 님의 베스트 기록 ({self.mode})", description="\n".join(lines), color=0xff66aa)
+        embed.set_footer(text=f"{self.page + 1}/{self.pages} 페이지 · 베스트 {len(self.plays)}개 가중 합계 {self.total:,.0f}pp (보너스 제외)")
+
+        return embed
+
 
 class Osu(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         
-        # 1. DB 연결 (Cog가 로드될 때 실행)
-        self.conn = sqlite3.connect("osu_bot.db")
-        self.cursor = self.conn.cursor()
-        
-        # 테이블 생성
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                discord_id INTEGER PRIMARY KEY,
-                osu_username TEXT
-            )
-        """)
-        self.conn.commit()
+        # 같은 비트맵을 동시에 여러 명이 요청하면 다운로드는 한 번만
+        self.beatmap_flight = SingleFlight()
+        # 무거운 명령어(?rs, /top, /compare) 동시 실행 제한과 중복 요청 합치기
+        self.admission = AdmissionControl()
+        # .osu 다운로드 원본/미러별 서킷 브레이커
+        self.download_breakers = {
+            source: CircuitBreaker(BEATMAP_BREAKER_FAILURES, BEATMAP_BREAKER_RESET)
+            for source in ("origin", "mirror")
+        }
+        # /osu 프로필 캐시 (TTL이 지나면 캐시를 먼저 보여주고 뒤에서 갱신)
+        self.profile_cache = ProfileCache(self._fetch_profile)
+        # /top 계산 결과 ((osu_user_id, mode) -> (베스트 기록 구성, 결과, 만료 시각 또는 None))
+        self.top_cache = OrderedDict()
+
+        # 연동 유저 새 탑 플레이 추적 (알림 채널이 설정된 서버만)
+        self.tracker = ScoreTracker(bot.osu_api, bot.storage)
+        self.track_loop.start()
+
+        # 오래된 PP/랭킹 기록 정리
+        self.history_loop.start()
+
+        metrics.add_collector("osu", self._collect_metrics)
 
-    # 봇이 꺼지거나 Cog가 언로드될 때 DB 연결 종료
     def cog_unload(self):
-        self.conn.close()
+        self.track_loop.cancel()
+        self.history_loop.cancel()
+
+    # 프로필 캐시 적중 수, 추적기 누적 값, 다운로드 서킷 브레이커 상태, 합쳐진 .osu 다운로드 수 (?stats, Prometheus용)
+    def _collect_metrics(self):
+        cache = self.profile_cache
+        tracker = self.tracker.stats()
+        breakers = [
+            (name, {"source": source}, value)
+            for source, breaker in self.download_breakers.items()
+            for name, value in (("beatmap_breaker_open", int(breaker.state != CLOSED)), ("beatmap_breaker_skipped", breaker.skipped))
+        ]
+        admission = self.admission.stats()
+        flight = self.beatmap_flight.stats()
+        return breakers + [
+            ("singleflight_calls", {"flight": "beatmap"}, flight["calls"]),
+            ("singleflight_deduplicated", {"flight": "beatmap"}, flight["deduplicated"]),
+            ("admission_active", {}, admission["active"]),
+            ("admission_queued", {}, admission["queued"]),
+            ("cache_hits", {"cache": "profile"}, cache.hits + cache.stale_hits),
+            ("cache_misses", {"cache": "profile"}, cache.misses),
+            ("profile_cache_stale_hits", {}, cache.stale_hits),
+            ("tracker_checked", {}, tracker["checked"]),
+            ("tracker_api_calls", {}, tracker["api_calls"]),
+            ("tracker_announced", {}, tracker["announced"]),
+        ]
+
+    async def _fetch_profile(self, user, mode):
+        key = "id" if isinstance(user, int) else "username"
+        profile = await self.bot.osu_api.user(user, mode=mode, key=key)
+
+        # 프로필을 새로 받을 때마다 PP/랭킹 기록 (/progress 용, 하루 한 줄)
+        stats = profile.statistics
+        if stats:
+            await self.bot.storage.record_history([(profile.id, mode, today(), stats.pp, stats.global_rank)])
+        return profile
+
+    # 디스코드 유저의 연동 계정 (osu_user_id, osu_username, mode), 없으면 None
+    async def get_linked_account(self, discord_id):
+        account = await self.bot.storage.get_account(discord_id)
+        if account is None:
+            return None
+
+        osu_user_id, osu_username, mode = account
+
+        # 예전 스키마에서 넘어온 계정은 ID를 한 번만 조회해서 저장
+        if osu_user_id is None:
+            try:
+                user = await self.bot.osu_api.user(osu_username, mode=mode, key="username")
+            except Exception as e:
+                print(f"osu! ID 채우기 실패 ({osu_username}): {e}")
+                return None, osu_username, mode
+            osu_user_id, osu_username = user.id, user.username
+            await self.bot.storage.set_account(discord_id, osu_user_id, osu_username, mode)
+
+        return osu_user_id, osu_username, mode
+
+    # 명령어 대상 찾기: 비워두면 내 계정, @멘션이면 그 사람의 연동 계정, 그 외에는 입력한 닉네임
+    # (account, 안내 메시지)를 돌려준다. account는 (osu_user_id 또는 None, osu_username, mode), 연동 정보가 없으면 None
+    async def find_target(self, ctx, username, command):
+        if username and not (username.startswith("<@") and username.endswith(">")):
+            return (None, username, "osu"), None
+
+        if username:
+            discord_id = int(''.join(filter(str.isdigit, username)))
+            account = await self.get_linked_account(discord_id)
+            error = "해당 유저는 아직 봇에 계정을 연동하지 않았습니다."
+        else:
+            discord_id = ctx.author.id
+            account = await self.get_linked_account(discord_id)
+            error = f"연동된 계정이 없습니다. `?link 닉네임`을 먼저 하거나 `?{command} 닉네임`을 입력하세요."
+
+        if account is None:
+            return None, error
+        # 이 서버에서 쓰인 연동 계정은 서버 목록에 기록 (기록 알림, 랭킹용)
+        if ctx.guild:
+            await self.bot.storage.add_guild_link(ctx.guild.id, discord_id)
+        return account, None
+
+    # find_target과 같고, 연동 정보가 없으면 안내를 보낸 뒤 None
+    async def resolve_target(self, ctx, username, command):
+        account, error = await self.find_target(ctx, username, command)
+        if error:
+            await ctx.send(error)
+        return account
+
+    # 무거운 명령어는 입장 관리를 거쳐서 실행. 들어가지 못하면 기다리지 않고 바로 안내
+    async def run_heavy(self, ctx, command, func, *args):
+        channel_id = ctx.channel.id if ctx.channel else None
+        async with self.admission.admit(ctx.author.id, channel_id, command, args) as reason:
+            if reason is None:
+                await func(ctx, *args)
+                return
+        await ctx.send(BUSY_MESSAGES.get(reason, BUSY), ephemeral=True)
+
+    # .osu 파일은 디스크 캐시를 먼저 확인하고, 없거나 체크섬이 다를 때만 새로 받는다
+    # 받은 파일이 API 체크섬과 다르면(다른 버전) 캐시에 넣지도, 계산에 쓰지도 않는다
+    async def fetch_beatmap(self, beatmap):
+        checksum = getattr(beatmap, "checksum", None)
+        status = getattr(beatmap, "status", None)
+        return await self.beatmap_flight.do((beatmap.id, checksum), self._fetch_beatmap, beatmap.id, checksum, status)
+
+    async def _fetch_beatmap(self, beatmap_id, checksum, status):
+        cache = self.bot.beatmap_cache
+
+        map_content = await asyncio.to_thread(cache.get, beatmap_id, checksum, status)
+        if map_content is not None:
+            return map_content
+
+        start = time.perf_counter()
+        map_content = await self._download_beatmap(beatmap_id)
+        if map_content:
+            metrics.observe("beatmap_download_seconds", time.perf_counter() - start)
+            metrics.inc("beatmap_download_bytes", len(map_content))
+            md5 = await asyncio.to_thread(cache.put, beatmap_id, map_content, checksum)
+            if checksum and md5 != checksum:
+                metrics.inc("beatmap_checksum_mismatch")
+                print(f".osu 체크섬 불일치 ({beatmap_id}): API {checksum}, 받은 파일 {md5}")
+                return None
+        return map_content
+
+    # 원본에서 받고, BEATMAP_HEDGE_DELAY 안에 끝나지 않거나 실패하면 미러에도 요청해서 먼저 온 쪽을 쓴다
+    # 서킷 브레이커가 모두 열려 있으면 요청 없이 None (명령어는 API 값으로 대신 보여준다)
+    async def _download_beatmap(self, beatmap_id):
+        sources = ("origin", "mirror") if OSU_BEATMAP_MIRROR_URL else ("origin",)
+        pending = set()
+        started = 0
+        try:
+            for source in sources:
+                if pending:
+                    done, pending = await asyncio.wait(pending, timeout=BEATMAP_HEDGE_DELAY)
+                    map_content = next((task.result() for task in done if task.result()), None)
+                    if map_content:
+                        return map_content
+                if not self.download_breakers[source].allow():
+                    continue
+                if pending:
+                    metrics.inc("beatmap_download_hedges")
+                pending.add(asyncio.ensure_future(self._download_from(source, beatmap_id)))
+                started += 1
+
+            if not started:
+                metrics.inc("beatmap_download_skipped")
+                return None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                map_content = next((task.result() for task in done if task.result()), None)
+                if map_content:
+                    return map_content
+            return None
+        finally:
+            # 헤지에서 진 요청은 취소
+            for task in pending:
+                task.cancel()
+
+    # 한 곳에서 .osu 파일 받기. 시간 초과, 5xx, 연결 오류는 그 곳의 서킷 브레이커에 실패로 기록하고 None
+    async def _download_from(self, source, beatmap_id):
+        url = (OSU_BEATMAP_URL if source == "origin" else OSU_BEATMAP_MIRROR_URL).format(id=beatmap_id)
+        breaker = self.download_breakers[source]
+        try:
+            async with self.bot.http_session.get(url, timeout=aiohttp.ClientTimeout(total=BEATMAP_DOWNLOAD_TIMEOUT)) as resp:
+                if resp.status != 200:
+                    # 없는 맵(404) 등은 서버는 멀쩡한 것이므로 서버 문제(5xx, 429)만 실패로 센다
+                    if resp.status >= 500 or resp.status == 429:
+                        breaker.record_failure()
+                    else:
+                        breaker.record_success()
+                    metrics.inc("beatmap_downloads", result="error", source=source)
+                    return None
+                map_content = await resp.read()
+        except asyncio.TimeoutError:
+            breaker.record_failure()
+            metrics.inc("beatmap_downloads", result="timeout", source=source)
+            return None
+        except aiohttp.ClientError as e:
+            print(f".osu 다운로드 실패 ({source}, {beatmap_id}): {e!r}")
+            breaker.record_failure()
+            metrics.inc("beatmap_downloads", result="error", source=source)
+            return None
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+
+        breaker.record_success()
+        metrics.inc("beatmap_downloads", result="ok", source=source)
+        return map_content
 
     # ==========================================
     # 계정 연동 명령어 (?link, /link)
     # ==========================================
     @commands.hybrid_command(name="link", description="내 디스코드 계정과 osu! 닉네임을 연결합니다.")
-    @app_commands.describe(username="연동할 osu! 닉네임")
-    async def link(self, ctx, username: str):
+    @app_commands.describe(username="연동할 osu! 닉네임", mode="주로 플레이하는 모드 (osu, taiko, fruits, mania)")
+    async def link(self, ctx, username: str, mode: str = "osu"):
         await ctx.defer()
 
+        if mode not in MODES:
+            await ctx.send(f"모드는 {', '.join(MODES)} 중 하나로 입력하세요.")
+            return
+
         try:
             # main.py에 있는 osu_api를 가져와서 사용
-            user = self.bot.osu_api.user(username, mode="osu", key="username")
+            user = await self.bot.osu_api.user(username, mode=mode, key="username")
             
-            # DB에 저장
-            self.cursor.execute("REPLACE INTO users (discord_id, osu_username) VALUES (?, ?)", (ctx.author.id, user.username))
-            self.conn.commit()
+            # DB에 저장 (닉네임이 바뀌어도 찾을 수 있게 osu! ID도 같이 저장)
+            await self.bot.storage.set_account(ctx.author.id, user.id, user.username, mode)
+            if ctx.guild:
+                await self.bot.storage.add_guild_link(ctx.guild.id, ctx.author.id)
             
             await ctx.send(f"**{ctx.author.display_name}**님의 계정이 osu! 닉네임 **'{user.username}'**으로 연동되었습니다!")
         
         except ValueError:
             await ctx.send("해당 닉네임의 osu! 유저를 찾을 수 없습니다.")
+        except OsuUnavailable:
+            await ctx.send(OSU_UNAVAILABLE)
         except Exception as e:
             await ctx.send(f"오류 발생: {e}")
 
+    # ==========================================
+    # 기록 알림 채널 설정 (?track, ?untrack)
+    # ==========================================
+    @commands.hybrid_command(name="track", description="연동된 멤버의 새 탑 플레이를 이 채널에 알립니다.")
+    @commands.guild_only()
+    @commands.has_permissions(manage_guild=True)
+    async def track(self, ctx):
+        await self.bot.storage.set_track_channel(ctx.guild.id, ctx.channel.id)
+        await ctx.send(f"이제 이 서버에 연동된 멤버의 새 탑 플레이를 {ctx.channel.mention} 채널에 알립니다.")
+
+    @commands.hybrid_command(name="untrack", description="새 탑 플레이 알림을 끕니다.")
+    @commands.guild_only()
+    @commands.has_permissions(manage_guild=True)
+    async def untrack(self, ctx):
+        await self.bot.storage.set_track_channel(ctx.guild.id, None)
+        await ctx.send("새 탑 플레이 알림을 껐습니다.")
+
+    # 봇이 서버에서 나가면 그 서버의 알림도 끈다 (그 서버 때문에만 추적하던 유저는 추적 대상에서 빠진다)
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        await self.bot.storage.set_track_channel(guild.id, None)
+
     # ==========================================
     # 프로필 조회 명령어 (/osu)
     # ==========================================
@@ -57,33 +431,16 @@ class Osu(commands.Cog):
     @app_commands.describe(username="닉네임 (비워두면 내 정보, @멘션하면 친구 정보)")
     async def osu(self, ctx, username: str = None):
         await ctx.defer()
-        target_username = None
 
         # [1] 닉네임 확인 로직
-        if username:
-            if username.startswith("<@") and username.endswith(">"):
-                user_id_str = ''.join(filter(str.isdigit, username))
-                self.cursor.execute("SELECT osu_username FROM users WHERE discord_id = ?", (int(user_id_str),))
-                result = self.cursor.fetchone()
-                if result:
-                    target_username = result[0]
-                else:
-                    await ctx.send(f"해당 유저는 아직 봇에 계정을 연동하지 않았습니다.")
-                    return
-            else:
-                target_username = username
-        else:
-            self.cursor.execute("SELECT osu_username FROM users WHERE discord_id = ?", (ctx.author.id,))
-            result = self.cursor.fetchone()
-            if result:
-                target_username = result[0]
-            else:
-                await ctx.send("연동된 계정이 없습니다. `?link 닉네임`을 먼저 하거나 `?osu 닉네임`을 입력하세요.")
-                return
+        target = await self.resolve_target(ctx, username, "osu")
+        if target is None:
+            return
+        target_id, target_username, mode = target
 
         try:
-            # API 호출
-            user = self.bot.osu_api.user(target_username, mode="osu", key="username")
+            # API 호출 (캐시에 있으면 캐시 사용)
+            user, cache_age = await self.profile_cache.get(target_id or target_username, mode)
             stats = user.statistics
 
             # 데이터 가공
@@ -114,186 +471,593 @@ class Osu(commands.Cog):
                 f"**SH:** `{stats.grade_counts.sh}` **S:** `{stats.grade_counts.s}` **A:** `{stats.grade_counts.a}`"
             )
             embed.add_field(name="Rank Counts", value=ranks_str, inline=False)
-            embed.set_footer(text=f"Requested by {ctx.author.display_name}", icon_url=ctx.author.display_avatar.url)
+            if cache_age < 60: age_str = "방금 갱신"
+            else: age_str = f"{int(cache_age // 60)}분 전 갱신"
+            embed.set_footer(text=f"Requested by {ctx.author.display_name} · {age_str}", icon_url=ctx.author.display_avatar.url)
             embed.timestamp = ctx.message.created_at if ctx.message else discord.utils.utcnow()
 
             await ctx.send(embed=embed)
 
         except ValueError:
             await ctx.followup.send(f"**{target_username}** 유저를 찾을 수 없습니다.")
+        except OsuUnavailable:
+            await ctx.followup.send(OSU_UNAVAILABLE)
         except Exception as e:
             await ctx.followup.send(f"오류 발생: {e}")
 
     # ==========================================
     # 최근 기록 명령어 (?recent, /recent)
     # ==========================================
+    # 맵 다운로드 + If-FC PP 계산은 임베드를 먼저 보낸 뒤에 하고, 끝나면 메시지를 수정한다
+    async def _calculate_recent(self, score, mode, mods_value, miss, calc):
+        beatmap = score.beatmap
+        map_content = await self.fetch_beatmap(beatmap)
+        if not map_content:
+            return False
+
+        checksum = getattr(beatmap, "checksum", None)
+        result = await self.bot.pp_service.calculate(
+            map_content, beatmap.id, checksum, mode, mods_value,
+            accuracy=score.accuracy * 100, combo=score.max_combo, misses=miss,
+            max_combo=calc["max_combo"],
+        )
+        calc["diff"] = await asyncio.to_thread(self.bot.difficulty_cache.put, beatmap.id, mode, mods_value, checksum, result["difficulty"])
+
+        if calc["max_combo"] is None:
+            calc["max_combo"] = result["max_combo"]
+        if not is_full_combo(score, miss, calc["max_combo"]):
+            calc["if_fc_pp"] = result["if_fc_pp"]
+        # 언랭크/러브드처럼 API가 PP를 주지 않는 기록은 직접 계산한 값으로 표시
+        if score.pp is None:
+            calc["pp"] = result["pp"]
+        return True
+
+    # pp_state: "pending"(계산 중), "done"(계산 완료 또는 필요 없음), "unavailable"(실패/시간 초과)
+    def build_recent_embed(self, score, user, active_mods, calc, pp_state):
+        beatmap = score.beatmap
+        beatmapset = score.beatmapset
+
+        # 비트맵 정보 안전 처리
+        bpm = beatmap.bpm if beatmap.bpm else 0
+        total_length = beatmap.total_length if beatmap.total_length else 0
+        ar = beatmap.ar if beatmap.ar else 0
+        od = beatmap.accuracy if beatmap.accuracy else 0
+        cs = beatmap.cs if beatmap.cs else 0
+        hp = beatmap.drain if beatmap.drain else 0
+
+        mods_str = "+" + "".join(active_mods) if active_mods else ""
+
+        # DT/HT/NC 계산
+        calc_bpm = bpm
+        calc_length = total_length
+        if "DT" in active_mods or "NC" in active_mods:
+            calc_bpm *= 1.5
+            calc_length /= 1.5
+        elif "HT" in active_mods:
+            calc_bpm *= 0.75
+            calc_length /= 0.75
+
+        m, s = divmod(int(calc_length), 60)
+        time_str = f"{m}:{s:02d}"
+
+        c300, c100, c50, miss = get_hit_counts(score.statistics)
+        real_max_combo = calc["max_combo"]
+        is_fc = is_full_combo(score, miss, real_max_combo)
+        diff = calc["diff"]
+
+        # 결과 메시지 포맷팅
+        raw_rank = getattr(score.rank, "name", str(score.rank)).replace("Grade.", "")
+
+        # 노트 수 계산 (캐시의 노트 수는 osu!standard 기록만 있음)
+        if diff and diff["n_circles"] is not None:
+            total_objects = diff["n_circles"] + diff["n_sliders"] + diff["n_spinners"]
+        else:
+            total_objects = beatmap.count_circles + beatmap.count_sliders + beatmap.count_spinners
+        current_objects = c300 + c100 + c50 + miss
+
+        current_pp = f"{calc['pp']:.0f}pp" if calc["pp"] is not None else "?pp"
+        if_fc_pp = calc["if_fc_pp"]
+
+        if raw_rank == "F":
+            progress = (current_objects / total_objects * 100) if total_objects > 0 else 0
+            if if_fc_pp: pp_display = f"**Failed @ {progress:.1f}%** (If FC: **{if_fc_pp:.0f}pp**)"
+            else: pp_display = f"**Failed @ {progress:.1f}%**"
+        elif is_fc:
+            pp_display = f"**{current_pp} FC**"
+        else:
+            if if_fc_pp: pp_display = f"**{current_pp}** ➔ **{if_fc_pp:.0f}pp** for **{score.accuracy * 100:.2f}% FC**"
+            else: pp_display = f"**{current_pp}**"
+
+        if pp_state == "pending":
+            pp_display += "\n*If-FC PP 계산 중...*"
+        elif pp_state == "unavailable":
+            pp_display += "\n*If-FC PP를 계산할 수 없습니다*"
+
+        rank_map = {"XH": "SSH", "X": "SS", "SH": "SH", "S": "S", "A": "A", "B": "B", "C": "C", "D": "D", "F": "Fail"}
+        rank_display = rank_map.get(raw_rank, raw_rank)
+
+        if user.profile_colour: embed_color = int(user.profile_colour.replace("#", ""), 16)
+        else: embed_color = 0xff66aa
+
+        embed = discord.Embed(title=f"{beatmapset.title} [{beatmap.version}] {mods_str}", url=beatmap.url, description=pp_display, color=embed_color)
+        embed.set_author(name=f"{user.username} 님의 최근 플레이", icon_url=user.avatar_url)
+        embed.set_thumbnail(url=beatmapset.covers.list)
+
+        final_max_combo = real_max_combo if real_max_combo else score.max_combo
+        combo_str = f"**{score.max_combo:,}x** / {final_max_combo:,}x" if is_fc else f"{score.max_combo:,}x / {final_max_combo:,}x"
+        
+        info_value = f"**{rank_display}** │ **{score.accuracy * 100:.2f}%** │ {combo_str}"
+        embed.add_field(name="Score Info", value=info_value, inline=False)
+        
+        hit_str = f"300: **{c300}** 100: **{c100}** 50: **{c50}** Miss: **{miss}**"
+        embed.add_field(name="Hit Details", value=hit_str, inline=False)
+        
+        map_stats_str = f"Length: `{time_str}`  BPM: `{calc_bpm:.0f}`  CS: `{cs:.1f}`  AR: `{ar:.1f}`  OD: `{od:.1f}`  HP: `{hp:.1f}`"
+        embed.add_field(name="Map Stats", value=map_stats_str, inline=False)
+        
+        embed.timestamp = score.ended_at if score.ended_at else discord.utils.utcnow()
+        embed.set_footer(text=f"Played by {user.username}")
+        return embed
+
     @commands.hybrid_command(name="recent", aliases=['rs', 'r'], description="유저의 가장 최근 플레이 기록을 조회합니다.")
     @app_commands.describe(username="닉네임 (비워두면 내 기록, @멘션하면 친구 기록)")
     async def recent(self, ctx, username: str = None):
         await ctx.defer()
-        target_username = None
+        await self.run_heavy(ctx, "recent", self._recent, username)
 
+    async def _recent(self, ctx, username):
         # [1] 닉네임 확인
-        if username:
-            if username.startswith("<@") and username.endswith(">"):
-                user_id_str = ''.join(filter(str.isdigit, username))
-                self.cursor.execute("SELECT osu_username FROM users WHERE discord_id = ?", (int(user_id_str),))
-                result = self.cursor.fetchone()
-                if result: target_username = result[0]
-                else:
-                    await ctx.send(f"해당 유저는 계정을 연동하지 않았습니다.")
-                    return
-            else:
-                target_username = username
-        else:
-            self.cursor.execute("SELECT osu_username FROM users WHERE discord_id = ?", (ctx.author.id,))
-            result = self.cursor.fetchone()
-            if result: target_username = result[0]
-            else:
-                await ctx.send("연동된 계정이 없습니다. `?link 닉네임`을 먼저 하거나 `?rs 닉네임`을 입력하세요.")
-                return
+        target = await self.resolve_target(ctx, username, "rs")
+        if target is None:
+            return
+        target_id, target_username, mode = target
 
         try:
-            user = self.bot.osu_api.user(target_username, mode="osu", key="username")
-            scores = self.bot.osu_api.user_scores(user.id, type="recent", include_fails=True, limit=1)
+            # 연동된 계정은 ID를 알고 있으므로 유저 조회 없이 바로 기록 조회
+            user = None
+            if target_id is None:
+                user = await self.bot.osu_api.user(target_username, mode=mode, key="username")
+                target_id, target_username = user.id, user.username
+            scores = await self.bot.osu_api.user_scores(target_id, type="recent", include_fails=True, mode=mode, limit=1)
 
             if not scores:
-                await ctx.send(f"**{user.username}** 님의 최근 기록이 없습니다.")
+                await ctx.send(f"**{target_username}** 님의 최근 기록이 없습니다.")
                 return
 
             score = scores[0]
+            # 기록에 포함된 유저 정보 (닉네임, 아바타, 프로필 색) 사용
+            # (Ossapi의 score.user()는 API를 다시 부르는 메서드라서, 응답에 들어있던 _user를 쓴다)
+            if getattr(score, "_user", None):
+                user = score._user
+            elif user is None:
+                user = await self.bot.osu_api.user(target_id, mode=mode, key="id")
             beatmap = score.beatmap
-            beatmapset = score.beatmapset
-            
-            # 비트맵 정보 안전 처리
-            bpm = beatmap.bpm if beatmap.bpm else 0
-            total_length = beatmap.total_length if beatmap.total_length else 0
-            ar = beatmap.ar if beatmap.ar else 0
-            od = beatmap.accuracy if beatmap.accuracy else 0
-            cs = beatmap.cs if beatmap.cs else 0
-            hp = beatmap.drain if beatmap.drain else 0
-
-            # 모드 처리
-            active_mods = []
-            if score.mods:
-                if isinstance(score.mods, list):
-                    for m in score.mods:
-                        if hasattr(m, 'acronym'): active_mods.append(str(m.acronym))
-                        else: active_mods.append(str(m))
-                else:
-                    active_mods = str(score.mods).split(" ")
-
-            mods_str = "+" + "".join(active_mods) if active_mods else ""
-
-            # DT/HT/NC 계산
-            calc_bpm = bpm
-            calc_length = total_length
-            if "DT" in active_mods or "NC" in active_mods:
-                calc_bpm *= 1.5
-                calc_length /= 1.5
-            elif "HT" in active_mods:
-                calc_bpm *= 0.75
-                calc_length /= 0.75
-
-            m, s = divmod(int(calc_length), 60)
-            time_str = f"{m}:{s:02d}"
-
-            # PP 계산 로직
-            if_fc_pp = None
-            current_pp = score.pp if score.pp else 0
-            real_max_combo = beatmap.max_combo
-            is_fc = False
-            
-            try:
-                map_url = f"https://osu.ppy.sh/osu/{beatmap.id}"
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(map_url) as resp:
-                        if resp.status == 200:
-                            map_content = await resp.read()
-                            rosu_map = rosu_pp_py.Beatmap(bytes=map_content)
-                            
-                            mods_value = 0
-                            mod_bits = {"NF": 1, "EZ": 2, "TD": 4, "HD": 8, "HR": 16, "SD": 32, "DT": 64, "RX": 128, "HT": 256, "NC": 576, "FL": 1024, "SO": 4096}
-                            for mod_name in active_mods:
-                                if mod_name in mod_bits: mods_value += mod_bits[mod_name]
-
-                            if real_max_combo is None:
-                                diff_attrs = rosu_pp_py.Difficulty(mods=mods_value).calculate(rosu_map)
-                                real_max_combo = int(diff_attrs.max_combo)
-                            
-                            check_combo = real_max_combo if real_max_combo else 99999
-                            miss_count = getattr(score.statistics, "count_miss", 0) or 0
-                            is_fc = miss_count == 0 and (score.max_combo >= check_combo - 7)
-
-                            if not is_fc:
-                                perf_fc = rosu_pp_py.Performance(accuracy=score.accuracy * 100, mods=mods_value, misses=0, combo=check_combo).calculate(rosu_map)
-                                if_fc_pp = perf_fc.pp
 
+            # [2] API 값과 난이도 캐시만으로 채울 수 있는 만큼 채운다
+            active_mods = get_active_mods(score)
+            mods_value = get_mods_value(active_mods)
+            miss = get_hit_counts(score.statistics)[3]
+            checksum = getattr(beatmap, "checksum", None)
+            calc = {
+                "pp": score.pp,
+                "if_fc_pp": None,
+                "max_combo": beatmap.max_combo,
+                "diff": await asyncio.to_thread(self.bot.difficulty_cache.get, beatmap.id, mode, mods_value, checksum),
+            }
+            # 최대 콤보/노트 수를 캐시로 알면 FC 기록은 맵을 받을 필요가 없다
+            if calc["max_combo"] is None and calc["diff"]:
+                calc["max_combo"] = int(calc["diff"]["max_combo"])
+
+            # (API가 PP를 주지 않은 언랭크/러브드 기록은 FC여도 계산해야 한다)
+            if calc["diff"] is not None and calc["pp"] is not None and is_full_combo(score, miss, calc["max_combo"]):
+                await ctx.send(embed=self.build_recent_embed(score, user, active_mods, calc, "done"))
+                return
+
+            # [3] 일단 API 값으로 보내고, 맵 다운로드 + PP 계산이 끝나면 같은 메시지를 수정
+            message = await ctx.send(embed=self.build_recent_embed(score, user, active_mods, calc, "pending"))
+            try:
+                done = await asyncio.wait_for(self._calculate_recent(score, mode, mods_value, miss, calc), timeout=RECENT_PP_TIMEOUT)
             except Exception as calc_error:
-                print(f"계산 오류: {calc_error}")
-                miss_check = getattr(score.statistics, "count_miss", 0) or 0
-                is_fc = miss_check == 0
+                print(f"계산 오류: {calc_error!r}")
+                done = False
+            await message.edit(embed=self.build_recent_embed(score, user, active_mods, calc, "done" if done else "unavailable"))
 
-            # 결과 메시지 포맷팅
-            raw_rank = getattr(score.rank, "name", str(score.rank)).replace("Grade.", "")
-            
-            # 노트 수 계산
-            if 'rosu_map' in locals():
-                total_objects = rosu_map.n_circles + rosu_map.n_sliders + rosu_map.n_spinners
-            else:
-                total_objects = beatmap.count_circles + beatmap.count_sliders + beatmap.count_spinners
-
-            hits = score.statistics
-            c300 = getattr(hits, "count_300", getattr(hits, "great", 0)) or 0
-            c100 = getattr(hits, "count_100", getattr(hits, "ok", 0)) or 0
-            c50  = getattr(hits, "count_50",  getattr(hits, "meh", 0)) or 0
-            miss = getattr(hits, "count_miss", getattr(hits, "miss", 0)) or 0
-            current_objects = c300 + c100 + c50 + miss
-
-            if raw_rank == "F":
-                progress = (current_objects / total_objects * 100) if total_objects > 0 else 0
-                if if_fc_pp: pp_display = f"**Failed @ {progress:.1f}%** (If FC: **{if_fc_pp:.0f}pp**)"
-                else: pp_display = f"**Failed @ {progress:.1f}%**"
-            elif is_fc:
-                pp_display = f"**{current_pp:.0f}pp FC**"
-            else:
-                if if_fc_pp: pp_display = f"**{current_pp:.0f}pp** ➔ **{if_fc_pp:.0f}pp** for **{score.accuracy * 100:.2f}% FC**"
-                else: pp_display = f"**{current_pp:.0f}pp**"
+        except ValueError:
+            await ctx.followup.send(f"**{target_username}** 유저를 찾을 수 없습니다.")
+        except OsuUnavailable:
+            await ctx.followup.send(OSU_UNAVAILABLE)
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            await ctx.followup.send(f"오류 발생: {e}")
 
-            rank_map = {"XH": "SSH", "X": "SS", "SH": "SH", "S": "S", "A": "A", "B": "B", "C": "C", "D": "D", "F": "Fail"}
-            rank_display = rank_map.get(raw_rank, raw_rank)
+    # ==========================================
+    # 베스트 기록 명령어 (/top)
+    # ==========================================
+    # 기록 하나의 If-FC PP 계산 (맵 다운로드 + PP 계산 동시 실행 수는 semaphore로 제한)
+    # (play, 난이도 캐시에 저장할 줄 또는 None)을 돌려준다. 저장은 get_top_plays에서 한 번에
+    async def _top_play(self, score, mode, semaphore):
+        beatmap = score.beatmap
+        active_mods = get_active_mods(score)
+        mods_value = get_mods_value(active_mods)
+        miss = get_hit_counts(score.statistics)[3]
+        checksum = getattr(beatmap, "checksum", None)
 
-            if user.profile_colour: embed_color = int(user.profile_colour.replace("#", ""), 16)
-            else: embed_color = 0xff66aa
+        diff = await asyncio.to_thread(self.bot.difficulty_cache.get, beatmap.id, mode, mods_value, checksum)
+        max_combo = getattr(beatmap, "max_combo", None) or (int(diff["max_combo"]) if diff else None)
+        play = {"score": score, "mods": active_mods, "miss": miss, "pp": score.pp or 0, "if_fc_pp": None, "max_combo": max_combo}
 
-            embed = discord.Embed(title=f"{beatmapset.title} [{beatmap.version}] {mods_str}", url=score.beatmap.url, description=pp_display, color=embed_color)
-            embed.set_author(name=f"{user.username} 님의 최근 플레이", icon_url=user.avatar_url)
-            embed.set_thumbnail(url=beatmapset.covers.list)
+        # FC 기록은 If-FC PP가 지금 PP와 같으므로 계산하지 않는다
+        if diff is not None and is_full_combo(score, miss, max_combo):
+            play["if_fc_pp"] = play["pp"]
+            return play, None
 
-            final_max_combo = real_max_combo if real_max_combo else score.max_combo
-            combo_str = f"**{score.max_combo:,}x** / {final_max_combo:,}x" if is_fc else f"{score.max_combo:,}x / {final_max_combo:,}x"
-            
-            info_value = f"**{rank_display}** │ **{score.accuracy * 100:.2f}%** │ {combo_str}"
-            embed.add_field(name="Score Info", value=info_value, inline=False)
-            
-            hit_str = f"300: **{c300}** 100: **{c100}** 50: **{c50}** Miss: **{miss}**"
-            embed.add_field(name="Hit Details", value=hit_str, inline=False)
-            
-            map_stats_str = f"Length: `{time_str}`  BPM: `{calc_bpm:.0f}`  CS: `{cs:.1f}`  AR: `{ar:.1f}`  OD: `{od:.1f}`  HP: `{hp:.1f}`"
-            embed.add_field(name="Map Stats", value=map_stats_str, inline=False)
-            
-            embed.timestamp = score.ended_at if score.ended_at else discord.utils.utcnow()
-            embed.set_footer(text=f"Played by {user.username}")
+        async with semaphore:
+            try:
+                map_content = await self.fetch_beatmap(beatmap)
+                if not map_content:
+                    return play, None
+                result = await self.bot.pp_service.calculate(
+                    map_content, beatmap.id, checksum, mode, mods_value,
+                    accuracy=score.accuracy * 100, combo=score.max_combo, misses=miss,
+                    max_combo=max_combo,
+                )
+            except Exception as e:
+                print(f"/top 계산 오류 ({beatmap.id}): {e!r}")
+                return play, None
 
-            await ctx.send(embed=embed)
+        play["max_combo"] = max_combo or result["max_combo"]
+        play["if_fc_pp"] = play["pp"] if is_full_combo(score, miss, play["max_combo"]) else result["if_fc_pp"]
+        return play, (beatmap.id, mode, mods_value, checksum, result["difficulty"])
+
+    # 베스트 기록 100개를 받는 것 자체가 무거우므로 (Ossapi 파싱만 1초 가까이),
+    # 총 PP와 플레이 횟수가 지난번과 같으면 베스트 구성도 그대로라고 보고 지난 결과를 다시 쓴다
+    # (계산에 실패한 기록이 있는 결과는 TOP_FAILED_TTL초 동안만. 안 그러면 다음 플레이 전까지 계속 '계산 불가'로 보임)
+    async def get_top_plays(self, profile, mode):
+        key = (profile.id, mode)
+        signature = (profile.statistics.pp, profile.statistics.play_count)
+        cached = self.top_cache.get(key)
+        if cached and cached[0] == signature and (cached[2] is None or time.monotonic() < cached[2]):
+            self.top_cache.move_to_end(key)
+            return cached[1]
+
+        scores = await self.bot.osu_api.user_scores(profile.id, type="best", mode=mode, limit=TOP_PLAYS_LIMIT)
+        semaphore = asyncio.Semaphore(TOP_CONCURRENCY)
+        results = await asyncio.gather(*[self._top_play(score, mode, semaphore) for score in scores])
+        plays = [play for play, _ in results]
+        add_fc_gains(plays)
+
+        # 새로 계산한 난이도 속성은 트랜잭션 하나로 저장 (이벤트 루프 밖에서)
+        rows = [row for _, row in results if row]
+        if rows:
+            await asyncio.to_thread(self.bot.difficulty_cache.put_many, rows)
+
+        expires_at = None
+        if any(play["if_fc_pp"] is None for play in plays):
+            expires_at = time.monotonic() + TOP_FAILED_TTL
+        self.top_cache[key] = (signature, plays, expires_at)
+        self.top_cache.move_to_end(key)
+        while len(self.top_cache) > TOP_CACHE_SIZE:
+            self.top_cache.popitem(last=False)
+        return plays
+
+    @commands.hybrid_command(name="top", aliases=['best'], description="유저의 베스트 기록과 FC 했을 때의 PP를 봅니다.")
+    @app_commands.describe(username="닉네임 (비워두면 내 기록, @멘션하면 친구 기록)")
+    async def top(self, ctx, username: str = None):
+        await ctx.defer()
+        await self.run_heavy(ctx, "top", self._top, username)
+
+    async def _top(self, ctx, username):
+        target = await self.resolve_target(ctx, username, "top")
+        if target is None:
+            return
+        target_id, target_username, mode = target
+
+        try:
+            # 항상 최신 프로필로 베스트 기록이 바뀌었는지 확인 (가벼운 호출 1번, PP 기록도 같이 남음)
+            profile = await self._fetch_profile(target_id or target_username, mode)
+            target_username = profile.username
+
+            plays = await self.get_top_plays(profile, mode)
+            if not plays:
+                await ctx.send(f"**{target_username}** 님의 베스트 기록이 없습니다.")
+                return
+
+            view = TopView(target_username, mode, plays, ctx.author.id)
+            await view.send(ctx)
 
         except ValueError:
             await ctx.followup.send(f"**{target_username}** 유저를 찾을 수 없습니다.")
+        except OsuUnavailable:
+            await ctx.followup.send(OSU_UNAVAILABLE)
         except Exception as e:
-            import traceback
-            traceback.print_exc()
             await ctx.followup.send(f"오류 발생: {e}")
 
+    # ==========================================
+    # 같은 맵 기록 비교 명령어 (/compare)
+    # ==========================================
+    # 한 명의 이 맵 최고 기록 조회. 결과(또는 오류)는 row에 채운다
+    async def _compare_lookup(self, ctx, beatmap_id, mode, row):
+        account, _ = await self.find_target(ctx, row["player"], "compare")
+        if account is None:
+            row["error"] = "계정 연동 안 됨"
+            return
+        target_id, row["name"], _ = account
+
+        try:
+            if target_id is None:
+                user = await self.bot.osu_api.user(row["name"], mode=mode, key="username")
+                target_id, row["name"] = user.id, user.username
+        except ValueError:
+            row["error"] = "유저를 찾을 수 없음"
+            return
+        except OsuUnavailable:
+            row["error"] = "osu! 연결 불가"
+            return
+        except Exception as e:
+            row["error"] = f"오류: {e}"
+            return
+
+        try:
+            # 이 맵에 기록이 없으면 API가 404 (ValueError)
+            result = await self.bot.osu_api.beatmap_user_score(beatmap_id, target_id, mode=mode)
+        except ValueError:
+            row["error"] = "기록 없음"
+            return
+        except OsuUnavailable:
+            row["error"] = "osu! 연결 불가"
+            return
+        except Exception as e:
+            row["error"] = f"오류: {e}"
+            return
+
+        score = result.score
+        row["score"] = score
+        row["mods"] = get_active_mods(score)
+        row["miss"] = get_hit_counts(score.statistics)[3]
+        row["pp"] = score.pp
+
+    # 모인 기록을 맵 한 번 파싱으로 한꺼번에 계산 (PP가 없는 기록, FC가 아닌 기록의 If-FC PP)
+    async def _calculate_compare(self, beatmap, mode, rows, map_task):
+        checksum = getattr(beatmap, "checksum", None)
+        pending = [
+            row for row in rows
+            if row["score"] and (row["pp"] is None or not is_full_combo(row["score"], row["miss"], beatmap.max_combo))
+        ]
+        if not pending:
+            # 계산할 기록이 없으면 다운로드를 기다리지 않는다 (다운로드는 SingleFlight 안에서 끝까지 돌고 캐시를 채움)
+            map_task.add_done_callback(lambda task: task.cancelled() or task.exception())
+            return True
+        map_content = await map_task
+        if not map_content:
+            return False
+
+        jobs = [
+            (get_mods_value(row["mods"]), row["score"].accuracy * 100, row["score"].max_combo, row["miss"], beatmap.max_combo)
+            for row in pending
+        ]
+        results = await self.bot.pp_service.calculate_many(map_content, beatmap.id, checksum, mode, jobs)
+
+        await asyncio.to_thread(
+            self.bot.difficulty_cache.put_many,
+            [(beatmap.id, mode, job[0], checksum, result["difficulty"]) for job, result in zip(jobs, results)],
+        )
+        for row, result in zip(pending, results):
+            if row["pp"] is None:
+                row["pp"] = result["pp"]
+            if not is_full_combo(row["score"], row["miss"], beatmap.max_combo or result["max_combo"]):
+                row["if_fc_pp"] = result["if_fc_pp"]
+        return True
+
+    # pp_state: recent와 같음 ("pending", "done", "unavailable")
+    def build_compare_embed(self, beatmap, rows, pp_state):
+        beatmapset = beatmap._beatmapset
+        title = f"{beatmapset.title} [{beatmap.version}]" if beatmapset else f"[{beatmap.version}]"
+
+        # 기록이 있는 사람은 PP 순, 그 다음 조회 중, 마지막에 기록 없음/오류
+        scored = sorted((row for row in rows if row["score"]), key=lambda row: row["pp"] or 0, reverse=True)
+        waiting = [row for row in rows if not row["score"] and not row["error"]]
+        failed = [row for row in rows if row["error"]]
+
+        lines = []
+        for i, row in enumerate(scored, 1):
+            score = row["score"]
+            mods_str = " +" + "".join(row["mods"]) if row["mods"] else ""
+            pp_str = f"{row['pp']:.0f}pp" if row["pp"] is not None else "?pp"
+            combo = f"{score.max_combo:,}x/{beatmap.max_combo:,}x" if beatmap.max_combo else f"{score.max_combo:,}x"
+            line = f"**{i}. {row['name']}** · **{pp_str}**{mods_str} · {score.accuracy * 100:.2f}% · {combo} · {row['miss']} miss"
+            if row["if_fc_pp"]:
+                line += f" ➔ FC **{row['if_fc_pp']:.0f}pp**"
+            lines.append(line)
+        for row in waiting:
+            lines.append(f"**{row['name']}** · *조회 중...*")
+        for row in failed:
+            lines.append(f"**{row['name']}** · {row['error']}")
+
+        if pp_state == "pending" and scored:
+            lines.append("*If-FC PP 계산 중...*")
+        elif pp_state == "unavailable":
+            lines.append("*If-FC PP를 계산할 수 없습니다*")
+
+        embed = discord.Embed(title=title, url=beatmap.url, description="\n".join(lines), color=0xff66aa)
+        if beatmapset:
+            embed.set_thumbnail(url=beatmapset.covers.list)
+        embed.set_footer(text=f"{len(scored)}/{len(rows)}명 기록 있음")
+        return embed
+
+    @commands.hybrid_command(name="compare", aliases=['c'], description="한 비트맵에서 여러 유저의 최고 기록을 비교합니다.")
+    @app_commands.describe(beatmap="비트맵 ID 또는 링크", players="비교할 유저 (@멘션 또는 닉네임, 띄어쓰기로 구분, 비워두면 나)")
+    async def compare(self, ctx, beatmap: str, *, players: str = None):
+        await ctx.defer()
+        await self.run_heavy(ctx, "compare", self._compare, beatmap, players)
+
+    async def _compare(self, ctx, beatmap, players):
+        beatmap_id = parse_beatmap_id(beatmap)
+        if beatmap_id is None:
+            await ctx.send("비트맵 ID나 비트맵 링크를 입력하세요.")
+            return
+        names = split_players(players) or [None]
+        if len(names) > COMPARE_MAX_PLAYERS:
+            await ctx.send(f"한 번에 {COMPARE_MAX_PLAYERS}명까지 비교할 수 있습니다.")
+            return
+
+        try:
+            beatmap_info = await self.bot.osu_api.beatmap(beatmap_id)
+        except ValueError:
+            await ctx.send("해당 비트맵을 찾을 수 없습니다.")
+            return
+        except OsuUnavailable:
+            await ctx.send(OSU_UNAVAILABLE)
+            return
+        except Exception as e:
+            await ctx.send(f"오류 발생: {e}")
+            return
+        mode = getattr(beatmap_info.mode, "value", beatmap_info.mode)
+
+        # 맵 다운로드는 기록 조회와 동시에 시작 (캐시에 있으면 바로 끝남)
+        map_task = asyncio.ensure_future(self.fetch_beatmap(beatmap_info))
+        rows = [
+            {"player": name, "name": name or ctx.author.display_name, "score": None, "error": None, "mods": [], "miss": 0, "pp": None, "if_fc_pp": None}
+            for name in names
+        ]
+        pp_state = "pending"
+        message = await ctx.send(embed=self.build_compare_embed(beatmap_info, rows, pp_state))
+
+        # 결과가 올 때마다 메시지 수정. 수정 중에 들어온 결과는 모아서 한 번 더 수정
+        edit_lock = asyncio.Lock()
+        dirty = False
+
+        async def refresh():
+            nonlocal dirty
+            dirty = True
+            if edit_lock.locked():
+                return
+            async with edit_lock:
+                while dirty:
+                    dirty = False
+                    try:
+                        await message.edit(embed=self.build_compare_embed(beatmap_info, rows, pp_state))
+                    except discord.HTTPException as e:
+                        print(f"/compare 메시지 수정 실패: {e}")
+
+        async def lookup(row):
+            await self._compare_lookup(ctx, beatmap_id, mode, row)
+            await refresh()
+
+        # 조회는 모두 동시에: 전체 시간은 가장 느린 한 명의 조회 시간
+        await asyncio.gather(*[lookup(row) for row in rows])
+
+        try:
+            done = await asyncio.wait_for(self._calculate_compare(beatmap_info, mode, rows, map_task), timeout=RECENT_PP_TIMEOUT)
+        except Exception as calc_error:
+            print(f"/compare 계산 오류: {calc_error!r}")
+            done = False
+        pp_state = "done" if done else "unavailable"
+        await refresh()
+
+    # ==========================================
+    # PP/랭킹 변화 그래프 (/progress)
+    # ==========================================
+    @commands.hybrid_command(name="progress", description="osu! PP/랭킹 변화를 그래프로 봅니다.")
+    @app_commands.describe(username="닉네임 (비워두면 내 정보, @멘션하면 친구 정보)", days="볼 기간 (일, 기본 90)")
+    async def progress(self, ctx, username: str = None, days: int = 90):
+        await ctx.defer()
+
+        target = await self.resolve_target(ctx, username, "progress")
+        if target is None:
+            return
+        target_id, target_username, mode = target
+        days = max(2, min(days, 3650))
+
+        try:
+            # 오늘 기록도 들어가도록 프로필 조회 (캐시에 있으면 API 호출 없음)
+            user, _ = await self.profile_cache.get(target_id or target_username, mode)
+            history = await self.bot.storage.history(user.id, mode, today() - days)
+
+            if len(history) < 2:
+                await ctx.send(f"**{user.username}** 님의 기록이 아직 충분하지 않습니다. 며칠 동안 `?osu`로 조회되면 그래프를 볼 수 있습니다.")
+                return
+
+            first, last = history[0], history[-1]
+            summary = f"**{user.username}** 최근 {days}일: **{first[1]:,.0f}pp ➔ {last[1]:,.0f}pp** ({last[1] - first[1]:+,.0f}pp)"
+            if first[2] and last[2]:
+                summary += f" │ 랭킹 `#{first[2]:,}` ➔ `#{last[2]:,}`"
+
+            if not can_render():
+                await ctx.send(summary)
+                return
+
+            # 그래프 그리기는 스레드에서 (이벤트 루프 막지 않게)
+            png = await asyncio.to_thread(render_progress, user.username, mode, history)
+            await ctx.send(summary, file=discord.File(io.BytesIO(png), filename="progress.png"))
+
+        except ValueError:
+            await ctx.send(f"**{target_username}** 유저를 찾을 수 없습니다.")
+        except OsuUnavailable:
+            await ctx.send(OSU_UNAVAILABLE)
+        except Exception as e:
+            await ctx.send(f"오류 발생: {e}")
+
+    # 오래된 PP/랭킹 기록은 하루에 한 번 주 단위로 줄여서 테이블 크기를 유지
+    # 처음에는 전체를, 그 다음부터는 새로 기준일을 넘은 구간(+1주 겹침)만 처리
+    @tasks.loop(hours=24)
+    async def history_loop(self):
+        before_day = today() - HISTORY_FULL_DAYS
+        try:
+            deleted = await self.bot.storage.downsample_history(before_day)
+            if deleted:
+                print(f"PP/랭킹 기록 정리: {deleted}줄 삭제")
+        except Exception as e:
+            print(f"PP/랭킹 기록 정리 오류: {e}")
+
+    # ==========================================
+    # 새 탑 플레이 추적 (백그라운드)
+    # ==========================================
+    @tasks.loop(seconds=TRACKER_TICK_SECONDS)
+    async def track_loop(self):
+        try:
+            new_plays = await self.tracker.tick()
+        except OsuUnavailable:
+            # 토큰을 다시 받을 수 있을 때까지 조용히 건너뜀 (실패 로그는 OsuAuth가 남김)
+            return
+        except Exception as e:
+            print(f"기록 추적 오류: {e}")
+            return
+
+        for user, score, position in new_plays:
+            try:
+                await self.announce_top_play(user, score, position)
+            except Exception as e:
+                print(f"기록 알림 실패 ({user.username}): {e}")
+
+    @track_loop.before_loop
+    async def before_track_loop(self):
+        await self.bot.wait_until_ready()
+
+    async def announce_top_play(self, user, score, position):
+        beatmap = score.beatmap
+        beatmapset = score.beatmapset
+        active_mods = get_active_mods(score)
+        mods_str = "+" + "".join(active_mods) if active_mods else ""
+
+        if user.profile_colour: embed_color = int(user.profile_colour.replace("#", ""), 16)
+        else: embed_color = 0xff66aa
+
+        embed = discord.Embed(
+            title=f"{beatmapset.title} [{beatmap.version}] {mods_str}",
+            url=beatmap.url,
+            description=f"**#{position}** 탑 플레이! **{score.pp:.0f}pp** │ **{score.accuracy * 100:.2f}%** │ {score.max_combo:,}x",
+            color=embed_color,
+        )
+        embed.set_author(name=f"{user.username} 님의 새 기록", icon_url=user.avatar_url)
+        embed.set_thumbnail(url=beatmapset.covers.list)
+        embed.timestamp = score.ended_at if score.ended_at else discord.utils.utcnow()
+
+        for channel_id in await self.bot.storage.announce_channels(user.id):
+            channel = self.bot.get_channel(channel_id)
+            if channel:
+                await channel.send(embed=embed)
+
 # Cog 로드 함수
 async def setup(bot):
     await bot.add_cog(Osu(bot))
\ No newline at end of file
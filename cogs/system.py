@@ -1,9 +1,62 @@
+import os
 import discord
+from aiohttp import web
 from discord.ext import commands
 
+from utils.command_sync import save_hash
+from utils.metrics import metrics
+
+# Prometheus가 긁어갈 지표 엔드포인트 (http://127.0.0.1:9108/metrics), 포트를 0으로 하면 끔
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+
+
+def _ms(seconds):
+    return f"{seconds * 1000:.0f}ms"
+
+
+# 적중 수/실패 수 게이지를 캐시별 적중률 문자열로
+def _hit_ratios(gauges):
+    hits, misses = {}, {}
+    for name, labels, value in gauges:
+        if name == "cache_hits":
+            hits[labels["cache"]] = value
+        elif name == "cache_misses":
+            misses[labels["cache"]] = value
+    lines = []
+    for cache in sorted(hits):
+        total = hits[cache] + misses.get(cache, 0)
+        ratio = f"{hits[cache] / total * 100:.1f}%" if total else "-"
+        lines.append(f"{cache}: {ratio} ({hits[cache]}/{total})")
+    return lines
+
+
 class System(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.metrics_runner = None
+
+    async def cog_load(self):
+        if not METRICS_PORT:
+            return
+        app = web.Application()
+        app.router.add_get("/metrics", self.prometheus)
+        self.metrics_runner = web.AppRunner(app, access_log=None)
+        await self.metrics_runner.setup()
+        try:
+            await web.TCPSite(self.metrics_runner, METRICS_HOST, METRICS_PORT).start()
+            print(f"지표 엔드포인트: http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+        except OSError as e:
+            print(f"지표 엔드포인트 시작 실패: {e}")
+            await self.metrics_runner.cleanup()
+            self.metrics_runner = None
+
+    async def cog_unload(self):
+        if self.metrics_runner:
+            await self.metrics_runner.cleanup()
+
+    async def prometheus(self, request):
+        return web.Response(text=metrics.render_prometheus(), content_type="text/plain", charset="utf-8")
 
     # [긴급] 슬래시 명령어 강제 동기화 (!sync)
     @commands.command(name="sync")
@@ -12,11 +65,70 @@ class System(commands.Cog):
         
         try:
             synced = await self.bot.tree.sync() # 동기화 실행
+            save_hash(self.bot.tree) # 다음 부팅 때 같은 트리면 자동 동기화 생략
             await ctx.send(f"**{len(synced)}개**의 슬래시 명령어가 등록되었습니다!\n잠시 후 `/`를 입력해서 확인해보세요.")
             print(f"명령어 동기화 완료: {len(synced)}개")
         except Exception as e:
             await ctx.send(f"동기화 실패: {e}")
 
+    # 봇 내부 지표 요약 (?stats, 봇 주인만)
+    @commands.command(name="stats")
+    @commands.is_owner()
+    async def stats(self, ctx):
+        embed = discord.Embed(title="봇 지표", color=0x5865F2)
+
+        commands_summary = metrics.summary("command_seconds")
+        lines = [
+            f"{name}: {s['count']}회 · p50 {_ms(s['p50'])} · p95 {_ms(s['p95'])} · p99 {_ms(s['p99'])}"
+            for name, s in sorted(commands_summary.items(), key=lambda item: -item[1]["count"])
+        ]
+        embed.add_field(name="명령어", value="\n".join(lines) or "기록 없음", inline=False)
+
+        api_calls = metrics.counter_values("osu_api_calls")
+        lines = []
+        for endpoint, s in sorted(metrics.summary("osu_api_seconds").items(), key=lambda item: -item[1]["count"]):
+            errors = api_calls.get(f"{endpoint},error", 0)
+            lines.append(f"{endpoint}: {s['count']}회 (오류 {errors}) · p50 {_ms(s['p50'])} · p95 {_ms(s['p95'])}")
+        embed.add_field(name="osu! API", value="\n".join(lines[:10]) or "기록 없음", inline=False)
+
+        download = metrics.summary("beatmap_download_seconds").get("")
+        if download:
+            total_mb = metrics.counter("beatmap_download_bytes") / 1024 / 1024
+            value = f"{download['count']}개 · {total_mb:.1f}MB · p50 {_ms(download['p50'])} · p95 {_ms(download['p95'])}"
+        else:
+            value = "기록 없음"
+        # 실패(시간 초과 포함), 미러 헤지, 서킷 브레이커로 건너뛴 수와 지금 열려 있는 곳, 동시 요청이 합쳐져 생략된 다운로드 수
+        failed = sum(count for labels, count in metrics.counter_values("beatmap_downloads").items() if not labels.startswith("ok,"))
+        collected = metrics.collect()
+        opened = [labels["source"] for name, labels, gauge in collected if name == "beatmap_breaker_open" and gauge]
+        merged = sum(gauge for name, labels, gauge in collected if name == "singleflight_deduplicated" and labels.get("flight") == "beatmap")
+        value += (f"\n실패 {failed} · 헤지 {metrics.counter('beatmap_download_hedges')} · 건너뜀 {metrics.counter('beatmap_download_skipped')}"
+                  f" · 합침 {merged} · 차단 중: {', '.join(opened) or '없음'}")
+        embed.add_field(name="비트맵 다운로드", value=value, inline=False)
+
+        rosu = metrics.summary("rosu_calc_seconds").get("")
+        job = metrics.summary("pp_job_seconds").get("")
+        pp = self.bot.pp_service.stats()
+        if rosu and job:
+            value = (f"계산 p50 {_ms(rosu['p50'])} · p95 {_ms(rosu['p95'])} · p99 {_ms(rosu['p99'])}\n"
+                     f"대기 포함 p95 {_ms(job['p95'])} · 대기 {pp['queued']} · 거절 {pp['rejected']} · 시간 초과 {pp['timed_out']}")
+        else:
+            value = "기록 없음"
+        embed.add_field(name="PP 계산 (rosu)", value=value, inline=False)
+
+        # 무거운 명령어 입장 관리: 지금 실행/대기 중인 수와 거절 사유별 누적
+        gauges = {name: gauge for name, labels, gauge in metrics.collect() if name.startswith("admission_")}
+        rejected = {}
+        for labels, count in metrics.counter_values("admission_rejected").items():
+            reason = labels.split(",")[1]
+            rejected[reason] = rejected.get(reason, 0) + count
+        reasons = " · ".join(f"{reason} {count}" for reason, count in sorted(rejected.items())) or "없음"
+        value = f"실행 {gauges.get('admission_active', 0)} · 대기 {gauges.get('admission_queued', 0)}\n거절: {reasons}"
+        embed.add_field(name="무거운 명령어", value=value, inline=False)
+
+        embed.add_field(name="캐시 적중률", value="\n".join(_hit_ratios(metrics.collect())) or "기록 없음", inline=False)
+        await ctx.send(embed=embed)
+
 # 메인 파일에서 이 파일을 로드할 때 실행되는 함수
 async def setup(bot):
-    await bot.add_cog(System(bot))
\ No newline at end of file
+    await bot.add_cog(System(bot))
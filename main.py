@@ -1,16 +1,33 @@
 import os
+import time
 import discord
 import asyncio
+import aiohttp
 from discord.ext import commands
-from ossapi import Ossapi
 from dotenv import load_dotenv
+from utils.osu_api import AsyncOsuApi
+from utils.osu_auth import OsuAuth
+from utils.beatmap_cache import BeatmapCache
+from utils.difficulty_cache import DifficultyCache
+from utils.metrics import metrics
+from utils.pp_service import PPService
+from utils.rate_limit import LANE_NAMES
+from utils.storage import Storage
+from utils.command_sync import sync_if_changed
+
+# 시작 시간 측정 (on_ready에서 단계별로 출력)
+STARTUP_BEGIN = time.perf_counter()
 
 # 1. 환경 변수 로드
 load_dotenv(override=True)
+ENV_LOAD_TIME = time.perf_counter() - STARTUP_BEGIN
 
 DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
 OSU_CLIENT_ID = os.getenv("OSU_CLIENT_ID")
 OSU_CLIENT_SECRET = os.getenv("OSU_CLIENT_SECRET")
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "32"))
+# 개발용 서버 ID를 넣으면 그 서버에만 즉시 동기화 (전역 동기화는 반영이 느림)
+DEV_GUILD_ID = os.getenv("DEV_GUILD_ID")
 
 # 2. 봇 클래스 정의
 class MyBot(commands.Bot):
@@ -18,17 +35,41 @@ class MyBot(commands.Bot):
         intents = discord.Intents.default()
         intents.message_content = True
         super().__init__(command_prefix='?', intents=intents)
+        self.startup_timings = {"환경 변수 로드": ENV_LOAD_TIME}
 
-        # 3. osu! API 연결 (봇 전체에서 공유하기 위해 self에 저장)
-        try:
-            self.osu_api = Ossapi(OSU_CLIENT_ID, OSU_CLIENT_SECRET)
-            print("osu! API 연결 성공")
-        except Exception as e:
-            print(f"osu! API 연결 실패: {e}")
-            self.osu_api = None
+        # 3. osu! API 클라이언트 (봇 전체에서 공유하기 위해 self에 저장)
+        #    토큰은 여기서 받지 않고 setup_hook의 백그라운드 작업/첫 호출 때 비동기로 받는다
+        #    (.osu_token.json에 저장해서 재시작 시 재사용). 받지 못하면 명령어는 'osu! 사용 불가'로 응답한다
+        self.osu_api = AsyncOsuApi(OsuAuth(OSU_CLIENT_ID, OSU_CLIENT_SECRET))
+
+        # 봇 DB (계정 연동 등, WAL 모드 + 전용 스레드)
+        self.storage = Storage()
+
+        # .osu 파일 디스크 캐시 (If-FC PP 계산용, 모든 코그에서 공유)
+        self.beatmap_cache = BeatmapCache()
+        # (비트맵, 모드) 별 난이도 속성 캐시 (SQLite + 메모리 LRU)
+        self.difficulty_cache = DifficultyCache()
+        # rosu-pp 계산 전용 프로세스 풀
+        self.pp_service = PPService()
+
+        # 공유 HTTP 세션 (setup_hook에서 생성, close에서 종료)
+        self.http_session = None
+
+        # 명령어별 처리 시간 측정 (슬래시/접두사 명령어 모두 before/after 훅을 거친다)
+        self.before_invoke(self._start_command_timer)
+        self.after_invoke(self._stop_command_timer)
+        metrics.add_collector("bot", self._collect_metrics)
 
     async def setup_hook(self):
+        # 비트맵 다운로드 등 모든 코그가 같이 쓰는 HTTP 세션
+        # keep-alive로 연결을 재사용하고 DNS 결과도 캐시해서 매번 핸드셰이크하지 않게 한다
+        connector = aiohttp.TCPConnector(limit=HTTP_POOL_LIMIT, ttl_dns_cache=300, keepalive_timeout=60)
+        timeout = aiohttp.ClientTimeout(total=30, connect=5, sock_read=15)
+        self.http_session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        self.osu_api.start(self.http_session)
+
         # 4. Cogs 폴더의 파일들을 로드 (직원 출근)
+        start = time.perf_counter()
         if os.path.exists('./cogs'):
             for filename in os.listdir('./cogs'):
                 if filename.endswith('.py'):
@@ -37,19 +78,85 @@ class MyBot(commands.Bot):
                         print(f"Cog 로드 완료: {filename}")
                     except Exception as e:
                         print(f"Cog 로드 실패 ({filename}): {e}")
+        self.startup_timings["Cog 로드"] = time.perf_counter() - start
         
-        # 5. 슬래시 명령어 동기화
-        await self.tree.sync()
-        print("슬래시 명령어 동기화 완료")
+        # 5. 슬래시 명령어 동기화 (명령어 정의가 바뀌었을 때만)
+        start = time.perf_counter()
+        guild = None
+        if DEV_GUILD_ID:
+            guild = discord.Object(id=int(DEV_GUILD_ID))
+            self.tree.copy_global_to(guild=guild)
+        try:
+            synced = await sync_if_changed(self.tree, guild)
+            if synced is None:
+                print("슬래시 명령어 변경 없음, 동기화 생략")
+            else:
+                print(f"슬래시 명령어 동기화 완료: {synced}개" + (f" (서버 {DEV_GUILD_ID})" if guild else ""))
+        except Exception as e:
+            print(f"슬래시 명령어 동기화 실패: {e}")
+        self.startup_timings["명령어 동기화"] = time.perf_counter() - start
+
+    async def _start_command_timer(self, ctx):
+        ctx.started_at = time.perf_counter()
+
+    async def _stop_command_timer(self, ctx):
+        started_at = getattr(ctx, "started_at", None)
+        if started_at is not None:
+            metrics.observe("command_seconds", time.perf_counter() - started_at, command=ctx.command.qualified_name)
+            metrics.inc("commands", command=ctx.command.qualified_name, result="error" if ctx.command_failed else "ok")
+
+    # 캐시 적중 수, 대기열 길이 등 지금 값을 읽어서 지표로 내보낸다
+    def _collect_metrics(self):
+        pp = self.pp_service.stats()
+        api = self.osu_api.stats()
+        gauges = [
+            ("cache_hits", {"cache": "beatmap"}, self.beatmap_cache.hits),
+            ("cache_misses", {"cache": "beatmap"}, self.beatmap_cache.misses),
+            ("cache_hits", {"cache": "difficulty"}, self.difficulty_cache.hits),
+            ("cache_misses", {"cache": "difficulty"}, self.difficulty_cache.misses),
+            ("pp_pending", {}, pp["pending"]),
+            ("pp_rejected", {}, pp["rejected"]),
+            ("pp_timed_out", {}, pp["timed_out"]),
+            ("osu_api_retries", {}, api["retries"]),
+            ("osu_api_throttled", {}, api["throttled"]),
+            ("osu_api_deduplicated", {}, api["singleflight"]["deduplicated"]),
+            ("osu_api_tokens", {}, api["limiter"]["tokens"]),
+            ("osu_available", {}, int(api["auth"]["available"])),
+        ]
+        for lane in LANE_NAMES:
+            gauges.append(("osu_api_queued", {"lane": lane}, api["limiter"][lane]["queued"]))
+        return gauges
 
-bot = MyBot()
+    async def close(self):
+        # 봇 종료 시 osu! API 스레드 풀, HTTP 세션, DB, PP 계산 프로세스 정리
+        self.osu_api.close()
+        if self.http_session:
+            await self.http_session.close()
+        self.difficulty_cache.close()
+        self.pp_service.close()
+        self.storage.close()
+        await super().close()
 
-@bot.event
-async def on_ready():
-    print("-----------------------------------------")
-    print(f"로그인 성공! 봇 이름: {bot.user.name} (ID: {bot.user.id})")
-    print("이제 디스코드에서 /osu 명령어를 써보세요!")
-    print("-----------------------------------------")
+    async def on_ready(self):
+        print("-----------------------------------------")
+        print(f"로그인 성공! 봇 이름: {self.user.name} (ID: {self.user.id})")
+        print("이제 디스코드에서 /osu 명령어를 써보세요!")
+        # 처음 접속했을 때만 시작 단계별 소요 시간 출력 (재접속 때는 생략)
+        if self.startup_timings:
+            # osu! 토큰은 setup_hook의 백그라운드 작업에서 받으므로 끝났으면 같이 출력
+            token = self.osu_api.auth.first_token
+            if token:
+                self.startup_timings[f"osu! 토큰 ({token['source']})"] = token["seconds"]
+            else:
+                print("  osu! 토큰: 아직 받는 중")
+            for step, seconds in self.startup_timings.items():
+                print(f"  {step}: {seconds:.2f}초")
+            print(f"  준비 완료까지 총: {time.perf_counter() - STARTUP_BEGIN:.2f}초")
+            self.startup_timings = {}
+        print("-----------------------------------------")
 
 # 봇 실행
-bot.run(DISCORD_TOKEN)
\ No newline at end of file
+# PP 계산 워커 프로세스가 이 파일을 다시 import해도 봇이 또 켜지지 않도록 main에서만 실행
+if __name__ == "__main__":
+    bot = MyBot()
+    bot.run(DISCORD_TOKEN)
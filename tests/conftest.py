@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 저장소 루트의 cogs, utils를 import할 수 있게
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,132 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import cogs.osu as osu_cog
+from utils.admission import AdmissionControl
+from utils.beatmap_cache import BeatmapCache
+from utils.difficulty_cache import DifficultyCache
+from utils.osu_api import AsyncOsuApi
+from utils.rate_limit import RateLimiter
+from utils.storage import Storage
+
+# Ossapi 호출이 이벤트 루프를 막지 않는지 확인 (user-001)
+# 호출마다 time.sleep으로 네트워크 지연을 흉내 내는 가짜 Ossapi로 ?rs 50개를 동시에 돌려서,
+# 전체 시간이 '50 x 지연'이 아니라 요청 하나(user + user_scores)에 가까운지 본다.
+LATENCY = 0.2
+CONCURRENT = 50
+
+
+class FakeOssapi:
+    def user(self, user, mode=None, key=None):
+        time.sleep(LATENCY)
+        return SimpleNamespace(id=int(str(user)[6:]), username=str(user), profile_colour=None, avatar_url="https://a.ppy.sh/1")
+
+    def user_scores(self, user_id, type=None, include_fails=None, mode=None, limit=None):
+        time.sleep(LATENCY)
+        beatmap = SimpleNamespace(
+            id=75, checksum=None, status=None, max_combo=None, version="Insane", url="https://osu.ppy.sh/beatmaps/75",
+            bpm=180, total_length=183, ar=9, accuracy=8, cs=4, drain=5, count_circles=538, count_sliders=179, count_spinners=1,
+        )
+        score = SimpleNamespace(
+            id=user_id, _user=None, beatmap=beatmap,
+            beatmapset=SimpleNamespace(title="Test", covers=SimpleNamespace(list="https://assets.ppy.sh/1.jpg")),
+            mods=[], pp=100.0, accuracy=0.97, max_combo=500, rank="A", ended_at=None,
+            statistics=SimpleNamespace(great=700, ok=10, meh=0, miss=3),
+        )
+        return [score]
+
+
+class FakeAuth:
+    client_id = client_secret = "test"
+
+    async def get_token(self, session=None):
+        return "token"
+
+    def is_valid(self):
+        return True
+
+    def invalidate(self, token):
+        pass
+
+
+# .osu 다운로드는 항상 404 (If-FC 계산은 '계산 불가'로 끝남)
+class FakeResponse:
+    status = 404
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+
+class FakeSession:
+    def get(self, url, **kwargs):
+        return FakeResponse()
+
+
+class FakeContext:
+    def __init__(self, author_id):
+        self.author = SimpleNamespace(id=author_id, display_name=f"member{author_id}", display_avatar=SimpleNamespace(url=""))
+        self.guild = None
+        self.channel = SimpleNamespace(id=author_id)
+        self.message = None
+        self.messages = []
+
+    @property
+    def followup(self):
+        return self
+
+    async def defer(self):
+        pass
+
+    async def send(self, content=None, embed=None, **kwargs):
+        self.messages.append((content, embed))
+        return SimpleNamespace(edit=self.edit)
+
+    async def edit(self, content=None, embed=None, **kwargs):
+        self.messages.append((content, embed))
+
+
+class FakeBot:
+    def __init__(self, tmp_path):
+        self.osu_api = AsyncOsuApi(FakeAuth(), max_workers=CONCURRENT * 2, limiter=RateLimiter(per_minute=60000, burst=1000))
+        self.osu_api.api = FakeOssapi()
+        self.osu_api._api_token = "token"
+        self.storage = Storage(str(tmp_path / "test.db"))
+        self.beatmap_cache = BeatmapCache(str(tmp_path / "beatmap_cache"))
+        self.difficulty_cache = DifficultyCache(str(tmp_path / "test.db"))
+        self.http_session = FakeSession()
+
+    async def wait_until_ready(self):
+        await asyncio.Event().wait()
+
+
+def test_concurrent_recent_does_not_block_event_loop(tmp_path):
+    async def run():
+        bot = FakeBot(tmp_path)
+        cog = osu_cog.Osu(bot)
+        # 입장 관리 제한은 이 테스트의 대상이 아니므로 넉넉하게
+        cog.admission = AdmissionControl(max_active=CONCURRENT, per_user=CONCURRENT, per_channel=CONCURRENT)
+        contexts = [FakeContext(i) for i in range(1, CONCURRENT + 1)]
+        try:
+            start = time.perf_counter()
+            await asyncio.gather(*[
+                osu_cog.Osu.recent.callback(cog, ctx, f"player{ctx.author.id}") for ctx in contexts
+            ])
+            return time.perf_counter() - start, contexts
+        finally:
+            cog.track_loop.cancel()
+            cog.history_loop.cancel()
+            bot.osu_api.close()
+            bot.difficulty_cache.close()
+            bot.storage.close()
+
+    elapsed, contexts = asyncio.run(run())
+
+    for ctx in contexts:
+        assert ctx.messages and ctx.messages[0][1] is not None, ctx.messages
+        assert not any(content and "오류 발생" in content for content, _ in ctx.messages)
+    # 요청 하나는 user + user_scores = 2 x LATENCY. 순서대로 막혔다면 50배
+    assert elapsed < 4 * 2 * LATENCY, f"{CONCURRENT}개 동시 ?rs가 {elapsed:.2f}초 걸림"
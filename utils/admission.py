@@ -0,0 +1,122 @@
+import asyncio
+import os
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+
+from utils.metrics import metrics
+
+# 무거운 명령어(맵 다운로드 + PP 계산: ?rs, /top, /compare) 입장 관리
+# - 동시에 실행되는 수는 ADMISSION_MAX_ACTIVE개, 넘으면 ADMISSION_MAX_QUEUE개까지 줄을 선다
+# - 유저 한 명, 채널 하나가 실행+대기 중일 수 있는 수도 따로 제한 (한 명이 ?rs 연타로 줄을 다 차지하지 못하게)
+# - 같은 유저의 같은 요청(명령어 + 인자)이 아직 처리 중이면 새로 실행하지 않고 먼저 온 요청의 응답으로 갈음
+# - 줄이 가득 찼거나 ADMISSION_QUEUE_TIMEOUT초 안에 차례가 오지 않으면 바로 거절 (기다리게 하지 않음)
+#   async with admission.admit(ctx.author.id, ctx.channel.id, "recent", (username,)) as reason:
+#       if reason is None:
+#           ...  # 실행
+ADMISSION_MAX_ACTIVE = int(os.getenv("ADMISSION_MAX_ACTIVE", "8"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "32"))
+ADMISSION_PER_USER = int(os.getenv("ADMISSION_PER_USER", "2"))
+ADMISSION_PER_CHANNEL = int(os.getenv("ADMISSION_PER_CHANNEL", "8"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10"))
+
+# 거절 사유
+DUPLICATE = "duplicate"
+USER_LIMIT = "user"
+CHANNEL_LIMIT = "channel"
+QUEUE_FULL = "full"
+QUEUE_TIMEOUT = "timeout"
+
+
+class AdmissionControl:
+    def __init__(self, max_active=ADMISSION_MAX_ACTIVE, max_queue=ADMISSION_MAX_QUEUE, per_user=ADMISSION_PER_USER,
+                 per_channel=ADMISSION_PER_CHANNEL, queue_timeout=ADMISSION_QUEUE_TIMEOUT):
+        self.max_active = max_active
+        self.max_queue = max_queue
+        self.per_user = per_user
+        self.per_channel = per_channel
+        self.queue_timeout = queue_timeout
+        self._slots = asyncio.Semaphore(max_active)
+
+        self.active = 0
+        self.queued = 0
+        self._users = Counter()
+        self._channels = Counter()
+        self._pending = set()
+
+        self.admitted = 0
+        self.rejected = Counter()
+
+    def _check(self, user_id, channel_id, key):
+        if key in self._pending:
+            return DUPLICATE
+        if self._users[user_id] >= self.per_user:
+            return USER_LIMIT
+        if channel_id is not None and self._channels[channel_id] >= self.per_channel:
+            return CHANNEL_LIMIT
+        if self._slots.locked() and self.queued >= self.max_queue:
+            return QUEUE_FULL
+        return None
+
+    def _reject(self, command, reason):
+        self.rejected[reason] += 1
+        metrics.inc("admission_rejected", command=command, reason=reason)
+
+    # 들어가면 None, 거절되면 사유를 돌려준다 (with 블록 안에서 실행하면 자리를 차지하고, 나가면 반납)
+    @asynccontextmanager
+    async def admit(self, user_id, channel_id, command, args=()):
+        key = (user_id, command, args)
+        reason = self._check(user_id, channel_id, key)
+        if reason:
+            self._reject(command, reason)
+            yield reason
+            return
+
+        self._pending.add(key)
+        self._users[user_id] += 1
+        self._channels[channel_id] += 1
+        try:
+            start = time.perf_counter()
+            if not self._slots.locked():
+                # 빈 자리가 있으면 기다리지 않고 바로 들어간다
+                await self._slots.acquire()
+            else:
+                self.queued += 1
+                try:
+                    await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+                except asyncio.TimeoutError:
+                    reason = QUEUE_TIMEOUT
+                finally:
+                    self.queued -= 1
+
+            if reason:
+                self._reject(command, reason)
+                yield reason
+                return
+
+            metrics.observe("admission_wait_seconds", time.perf_counter() - start, command=command)
+            self.admitted += 1
+            self.active += 1
+            try:
+                yield None
+            finally:
+                self.active -= 1
+                self._slots.release()
+        finally:
+            self._pending.discard(key)
+            self._users[user_id] -= 1
+            if not self._users[user_id]:
+                del self._users[user_id]
+            self._channels[channel_id] -= 1
+            if not self._channels[channel_id]:
+                del self._channels[channel_id]
+
+    def stats(self):
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "max_active": self.max_active,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+        }
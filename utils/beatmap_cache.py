@@ -0,0 +1,158 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+# .osu 파일 디스크 캐시
+# - 파일 이름: {beatmap_id}.{md5}.osu  (md5 = API가 주는 beatmap.checksum과 같은 값)
+# - 랭크/러브드 맵은 내용이 바뀌지 않으므로 체크섬만 맞으면 계속 재사용
+# - 펜딩/그레이브야드 맵은 체크섬이 없으면 REVALIDATE_SECONDS가 지나면 다시 받는다
+# - 전체 크기가 max_bytes를 넘으면 가장 오래 안 쓴 파일부터 삭제
+BEATMAP_CACHE_DIR = os.getenv("BEATMAP_CACHE_DIR", "beatmap_cache")
+BEATMAP_CACHE_MAX_MB = int(os.getenv("BEATMAP_CACHE_MAX_MB", "512"))
+REVALIDATE_SECONDS = 60 * 60
+
+# ossapi RankStatus 값: RANKED=1, APPROVED=2, LOVED=4
+FROZEN_STATUSES = {1, 2, 4}
+
+
+def is_frozen(status):
+    value = getattr(status, "value", status)
+    try:
+        return int(value) in FROZEN_STATUSES
+    except (TypeError, ValueError):
+        return False
+
+
+class BeatmapCache:
+    def __init__(self, directory=BEATMAP_CACHE_DIR, max_bytes=BEATMAP_CACHE_MAX_MB * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # 크기 제한 때문에 지운 파일 수
+        self.evicted = 0
+        self._lock = threading.Lock()
+        # beatmap_id -> [md5, size, stored_at, last_access]
+        self._index = {}
+        self._total = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        for filename in os.listdir(self.directory):
+            # put 도중에 프로세스가 죽어서 남은 임시 파일 (크기 계산에 안 들어가므로 지운다)
+            if filename.endswith(".tmp"):
+                try:
+                    os.remove(os.path.join(self.directory, filename))
+                except FileNotFoundError:
+                    pass
+                continue
+            parts = filename.split(".")
+            if len(parts) != 3 or parts[2] != "osu" or not parts[0].isdigit():
+                continue
+            path = os.path.join(self.directory, filename)
+            stat = os.stat(path)
+            beatmap_id = int(parts[0])
+            old = self._index.get(beatmap_id)
+            if old and old[2] >= stat.st_mtime:
+                # 같은 맵의 옛 버전이 남아있으면 정리
+                os.remove(path)
+                continue
+            self._remove(beatmap_id)
+            self._index[beatmap_id] = [parts[1], stat.st_size, stat.st_mtime, stat.st_mtime]
+            self._total += stat.st_size
+
+    def _path(self, beatmap_id, md5):
+        return os.path.join(self.directory, f"{beatmap_id}.{md5}.osu")
+
+    def _remove(self, beatmap_id):
+        entry = self._index.pop(beatmap_id, None)
+        if not entry:
+            return
+        self._total -= entry[1]
+        try:
+            os.remove(self._path(beatmap_id, entry[0]))
+        except FileNotFoundError:
+            pass
+
+    # 이 체크섬의 파일이 이미 있는지 (적중/실패 수에는 세지 않음)
+    def has(self, beatmap_id, md5):
+        entry = self._index.get(beatmap_id)
+        return entry is not None and entry[0] == md5
+
+    # 캐시에 유효한 파일이 있으면 bytes, 없으면 None
+    def get(self, beatmap_id, checksum=None, status=None):
+        with self._lock:
+            entry = self._index.get(beatmap_id)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            md5, _, stored_at, _ = entry
+            if checksum:
+                valid = md5 == checksum
+            else:
+                valid = is_frozen(status) or time.time() - stored_at < REVALIDATE_SECONDS
+
+            if not valid:
+                self._remove(beatmap_id)
+                self.misses += 1
+                return None
+
+            entry[3] = time.time()
+            path = self._path(beatmap_id, md5)
+
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            with self._lock:
+                self._remove(beatmap_id)
+                self.misses += 1
+            return None
+
+        self.hits += 1
+        return data
+
+    # 임시 파일에 쓴 뒤 os.replace로 교체해서 반쯤 쓰인 파일이 보이지 않게 한다
+    # checksum을 주면 받은 파일의 md5가 다를 때(다른 버전) 저장하지 않는다. 받은 파일의 md5를 돌려준다
+    def put(self, beatmap_id, data, checksum=None):
+        md5 = hashlib.md5(data).hexdigest()
+        if checksum and md5 != checksum:
+            return md5
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(beatmap_id, md5))
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+        with self._lock:
+            old = self._index.get(beatmap_id)
+            if old and old[0] != md5:
+                self._remove(beatmap_id)
+            elif old:
+                self._total -= old[1]
+            now = time.time()
+            self._index[beatmap_id] = [md5, len(data), now, now]
+            self._total += len(data)
+            self._evict()
+        return md5
+
+    def _evict(self):
+        if self._total <= self.max_bytes:
+            return
+        target = self.max_bytes * 0.9
+        for beatmap_id, _ in sorted(self._index.items(), key=lambda item: item[1][3]):
+            if self._total <= target:
+                break
+            self._remove(beatmap_id)
+            self.evicted += 1
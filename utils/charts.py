@@ -0,0 +1,41 @@
+import datetime
+import io
+
+# matplotlib이 없으면 /progress는 그래프 대신 글로만 보여준다
+try:
+    from matplotlib.figure import Figure
+except ImportError:
+    Figure = None
+
+
+def can_render():
+    return Figure is not None
+
+
+# PP/랭킹 변화 그래프 PNG (pyplot 없이 Figure를 직접 써서 스레드에서 그려도 안전)
+# history: [(day, pp, global_rank), ...]
+def render_progress(username, mode, history):
+    dates = [datetime.date.fromordinal(datetime.date(1970, 1, 1).toordinal() + day) for day, _, _ in history]
+    pps = [pp for _, pp, _ in history]
+    ranks = [rank for _, _, rank in history]
+
+    fig = Figure(figsize=(8, 5), dpi=100)
+    pp_ax, rank_ax = fig.subplots(2, 1, sharex=True)
+
+    pp_ax.plot(dates, pps, color="#ff66aa", linewidth=2)
+    pp_ax.set_ylabel("pp")
+    pp_ax.grid(alpha=0.3)
+    pp_ax.set_title(f"{username} ({mode})")
+
+    # 랭킹은 숫자가 작을수록 좋으니 축을 뒤집는다
+    rank_ax.plot(dates, [rank if rank else float("nan") for rank in ranks], color="#66aaff", linewidth=2)
+    rank_ax.set_ylabel("global rank")
+    rank_ax.invert_yaxis()
+    rank_ax.grid(alpha=0.3)
+
+    fig.autofmt_xdate()
+    fig.tight_layout()
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png")
+    return buffer.getvalue()
@@ -0,0 +1,62 @@
+import time
+
+# 계속 실패하는 외부 서버를 잠시 건너뛰는 서킷 브레이커 (.osu 파일 다운로드 등)
+# - closed: 평소 상태. 연속 실패가 failure_threshold번 쌓이면 open
+# - open: reset_seconds 동안 allow()가 False (요청을 보내지 않고 바로 대체 경로로)
+# - half_open: 시간이 지나면 시험 요청 하나만 통과시키고, 성공하면 closed, 실패하면 다시 open
+#   if breaker.allow():
+#       ok = await download()
+#       breaker.record_success() if ok else breaker.record_failure()
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_seconds=30):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0
+        self._probing = False
+
+        self.opened = 0
+        self.skipped = 0
+
+    # 지금 요청을 보내도 되는지. half_open에서는 시험 요청 하나만 True
+    def allow(self):
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+            self.state = HALF_OPEN
+            self._probing = False
+
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        self.skipped += 1
+        return False
+
+    def record_success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.opened += 1
+                print(f"서킷 브레이커 열림 (연속 실패 {self.failures}회, {self.reset_seconds}초 동안 건너뜀)")
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+            self._probing = False
+
+    # 시험 요청이 결과 없이 끝났을 때 (헤지에서 져서 취소 등) 다음 요청이 다시 시험할 수 있게
+    def release(self):
+        self._probing = False
+
+    def stats(self):
+        return {"state": self.state, "failures": self.failures, "opened": self.opened, "skipped": self.skipped}
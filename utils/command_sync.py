@@ -0,0 +1,46 @@
+import hashlib
+import json
+import os
+
+# 슬래시 명령어 트리가 바뀌었을 때만 디스코드에 동기화한다.
+# 등록된 명령어 정의로 해시를 만들어 파일에 저장해두고, 다음 부팅 때 같으면 sync를 건너뛴다.
+COMMAND_HASH_FILE = os.getenv("COMMAND_HASH_FILE", ".command_tree_hash.json")
+
+
+def tree_hash(tree, guild=None):
+    payload = sorted(
+        (command.to_dict(tree) for command in tree.get_commands(guild=guild)),
+        key=lambda data: (data.get("type", 1), data["name"]),
+    )
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _scope_key(tree, guild):
+    return f"{tree.client.application_id}:{guild.id if guild else 'global'}"
+
+
+def _load(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_hash(tree, guild=None, path=COMMAND_HASH_FILE):
+    hashes = _load(path)
+    hashes[_scope_key(tree, guild)] = tree_hash(tree, guild)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(hashes, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+# 바뀌었으면 sync 후 동기화된 명령어 수, 그대로면 None
+async def sync_if_changed(tree, guild=None, path=COMMAND_HASH_FILE):
+    if _load(path).get(_scope_key(tree, guild)) == tree_hash(tree, guild):
+        return None
+
+    synced = await tree.sync(guild=guild)
+    save_hash(tree, guild, path)
+    return len(synced)
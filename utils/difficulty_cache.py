@@ -0,0 +1,128 @@
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# (beatmap_id, 모드, mods) 별 난이도 속성 캐시 (같은 맵도 taiko/catch/mania 컨버트는 값이 다르다)
+# - SQLite: 재시작해도 남는 숫자 값 (스타, 최대 콤보, 스킬별 난이도, 노트 수)
+# - 메모리 LRU: 자주 보는 맵은 DB 조회도 생략
+# rosu_pp_py.DifficultyAttributes 객체는 저장된 숫자로 다시 만들 수 없으므로
+# PP 계산용 객체 캐시는 PP 계산 프로세스(utils/pp_service.py)가 따로 들고 있는다.
+# BeatmapCache처럼 동기 함수라서 코그에서는 asyncio.to_thread로 부른다 (이벤트 루프에서 SQLite를 기다리지 않게).
+#   diff = await asyncio.to_thread(self.bot.difficulty_cache.get, beatmap.id, mode, mods, checksum)
+DIFFICULTY_CACHE_SIZE = int(os.getenv("DIFFICULTY_CACHE_SIZE", "1024"))
+
+ATTR_FIELDS = (
+    "stars", "max_combo", "n_circles", "n_sliders", "n_spinners",
+    "aim", "speed", "flashlight", "slider_factor", "speed_note_count", "ar", "hp",
+)
+INT_FIELDS = {"max_combo", "n_circles", "n_sliders", "n_spinners"}
+
+
+class DifficultyCache:
+    def __init__(self, db_path="osu_bot.db", max_entries=DIFFICULTY_CACHE_SIZE):
+        # 여러 스레드에서 불리므로 연결과 LRU는 잠금 하나로 보호
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._lock = threading.Lock()
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lru = OrderedDict()
+
+        # 모드 구분이 없던 예전 테이블은 컨버트 기록도 osu!standard로 계산한 값이라 버리고 새로 채운다
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(difficulty_attributes)")]
+        if columns and "mode" not in columns:
+            self.conn.execute("DROP TABLE difficulty_attributes")
+
+        self.conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS difficulty_attributes (
+                beatmap_id INTEGER,
+                mode TEXT,
+                mods INTEGER,
+                checksum TEXT,
+                {", ".join(f"{name} {'INTEGER' if name in INT_FIELDS else 'REAL'}" for name in ATTR_FIELDS)},
+                PRIMARY KEY (beatmap_id, mode, mods)
+            )
+        """)
+        self.conn.commit()
+
+    def _remember(self, key, entry):
+        self._lru[key] = entry
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    # 저장된 값이 있으면 dict, 없으면 None
+    # (n_circles/n_sliders/n_spinners 같은 값은 osu!standard에서만 채워지고 다른 모드는 None)
+    def get(self, beatmap_id, mode, mods, checksum=None):
+        with self._lock:
+            return self._get(beatmap_id, mode, mods, checksum)
+
+    def _get(self, beatmap_id, mode, mods, checksum):
+        key = (beatmap_id, mode, mods)
+        entry = self._lru.get(key)
+        if entry is None:
+            row = self.conn.execute(
+                f"SELECT checksum, {', '.join(ATTR_FIELDS)} FROM difficulty_attributes WHERE beatmap_id = ? AND mode = ? AND mods = ?",
+                key,
+            ).fetchone()
+            if row:
+                entry = dict(zip(ATTR_FIELDS, row[1:]), checksum=row[0])
+                self._remember(key, entry)
+
+        # 맵이 수정되어 체크섬이 바뀌었으면 옛 값은 버린다
+        if entry and checksum and entry["checksum"] and entry["checksum"] != checksum:
+            self._lru.pop(key, None)
+            entry = None
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self._lru.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    # values: ATTR_FIELDS 이름을 키로 하는 dict (PPService 결과의 "difficulty")
+    def put(self, beatmap_id, mode, mods, checksum, values):
+        values = {name: values.get(name) for name in ATTR_FIELDS}
+        with self._lock:
+            self.conn.execute(
+                f"REPLACE INTO difficulty_attributes (beatmap_id, mode, mods, checksum, {', '.join(ATTR_FIELDS)}) "
+                f"VALUES (?, ?, ?, ?, {', '.join('?' for _ in ATTR_FIELDS)})",
+                (beatmap_id, mode, mods, checksum, *values.values()),
+            )
+            self.conn.commit()
+
+            entry = dict(values, checksum=checksum)
+            self._remember((beatmap_id, mode, mods), entry)
+        return entry
+
+    # 여러 줄을 한 트랜잭션으로 저장 (캐시 미리 채우기용). rows: [(beatmap_id, mode, mods, checksum, values), ...]
+    def put_many(self, rows):
+        with self._lock:
+            self.conn.executemany(
+                f"REPLACE INTO difficulty_attributes (beatmap_id, mode, mods, checksum, {', '.join(ATTR_FIELDS)}) "
+                f"VALUES (?, ?, ?, ?, {', '.join('?' for _ in ATTR_FIELDS)})",
+                [(beatmap_id, mode, mods, checksum, *(values.get(name) for name in ATTR_FIELDS)) for beatmap_id, mode, mods, checksum, values in rows],
+            )
+            self.conn.commit()
+            for beatmap_id, mode, mods, _, _ in rows:
+                self._lru.pop((beatmap_id, mode, mods), None)
+
+    # 한 모드에서 주어진 모드 조합이 모두 저장된 (beatmap_id, checksum) 집합
+    def complete_entries(self, mods_list):
+        placeholders = ", ".join("?" for _ in mods_list)
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT beatmap_id, checksum FROM difficulty_attributes WHERE mods IN ({placeholders}) "
+                f"GROUP BY beatmap_id, checksum, mode HAVING COUNT(*) = ?",
+                (*mods_list, len(mods_list)),
+            ).fetchall()
+        return set(rows)
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
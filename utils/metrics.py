@@ -0,0 +1,147 @@
+from bisect import bisect_left
+from collections import deque
+
+# 봇 내부 지표 (명령어 지연 시간, osu! API 호출, 비트맵 다운로드, PP 계산 시간 등)
+# 프로세스 안에서 숫자만 모아두고, ?stats 명령어와 Prometheus 텍스트 엔드포인트에서 읽는다.
+#   from utils.metrics import metrics
+#   metrics.observe("osu_api_seconds", elapsed, endpoint="user")
+#   metrics.inc("beatmap_download_bytes", len(data))
+# 외부 라이브러리 없이 dict 조회 + 리스트 덧셈 정도만 하므로 호출 비용은 무시할 수준이다.
+
+# 지연 시간 히스토그램 버킷 (초)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# 백분위 계산에 쓰는 최근 측정값 개수
+RECENT_SAMPLES = 1000
+
+
+def _percentile(values, p):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.bucket_counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._recent = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, value):
+        self.bucket_counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self._recent.append(value)
+
+    # 최근 측정값 기준 p50/p95/p99
+    def percentiles(self):
+        recent = sorted(self._recent)
+        return {
+            "count": self.count,
+            "p50": _percentile(recent, 0.50),
+            "p95": _percentile(recent, 0.95),
+            "p99": _percentile(recent, 0.99),
+        }
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Metrics:
+    def __init__(self, prefix="osubot_"):
+        self.prefix = prefix
+        self.histograms = {}   # (이름, 라벨) -> Histogram
+        self.counters = {}     # (이름, 라벨) -> 누적 값
+        self._collectors = {}  # 읽을 때마다 현재 값을 돌려주는 함수 (캐시 적중 수, 대기열 길이 등)
+
+    def observe(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(value)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    # func()는 [(이름, {라벨}, 값), ...]을 돌려준다 (게이지로 내보냄)
+    # 같은 이름으로 다시 등록하면 교체된다 (코그를 다시 불러와도 중복되지 않게)
+    def add_collector(self, name, func):
+        self._collectors[name] = func
+
+    def collect(self):
+        gauges = []
+        for name, func in list(self._collectors.items()):
+            try:
+                gauges.extend(func())
+            except Exception as e:
+                print(f"지표 수집 실패 ({name}): {e}")
+        return gauges
+
+    # 이름별로 "라벨 값" -> 백분위 dict (?stats 출력용)
+    def summary(self, name):
+        result = {}
+        for (metric, labels), histogram in sorted(self.histograms.items()):
+            if metric == name:
+                result[",".join(str(value) for _, value in labels)] = histogram.percentiles()
+        return result
+
+    def counter(self, name, **labels):
+        return self.counters.get((name, _label_key(labels)), 0)
+
+    # 이름별로 "라벨 값" -> 누적 값
+    def counter_values(self, name):
+        return {
+            ",".join(str(value) for _, value in labels): value
+            for (metric, labels), value in sorted(self.counters.items())
+            if metric == name
+        }
+
+    # Prometheus text exposition format (0.0.4)
+    def render_prometheus(self):
+        lines = []
+        typed = set()
+
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            full_name = self.prefix + name
+            if full_name not in typed:
+                typed.add(full_name)
+                lines.append(f"# TYPE {full_name} histogram")
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.bucket_counts):
+                cumulative += count
+                lines.append(f"{full_name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{full_name}_bucket{_format_labels(labels, [('le', '+Inf')])} {histogram.count}")
+            lines.append(f"{full_name}_sum{_format_labels(labels)} {histogram.sum}")
+            lines.append(f"{full_name}_count{_format_labels(labels)} {histogram.count}")
+
+        for (name, labels), value in sorted(self.counters.items()):
+            full_name = self.prefix + name + "_total"
+            if full_name not in typed:
+                typed.add(full_name)
+                lines.append(f"# TYPE {full_name} counter")
+            lines.append(f"{full_name}{_format_labels(labels)} {value}")
+
+        for name, labels, value in sorted(self.collect(), key=lambda gauge: gauge[0]):
+            full_name = self.prefix + name
+            if full_name not in typed:
+                typed.add(full_name)
+                lines.append(f"# TYPE {full_name} gauge")
+            lines.append(f"{full_name}{_format_labels(_label_key(labels))} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+# 봇 전체에서 같이 쓰는 지표 저장소
+metrics = Metrics()
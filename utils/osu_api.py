@@ -0,0 +1,167 @@
+import asyncio
+import functools
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from ossapi import Ossapi
+from ossapi.ossapiv2 import ReauthenticationRequired
+
+from utils.metrics import metrics
+from utils.osu_auth import OsuUnavailable
+from utils.rate_limit import BACKGROUND, INTERACTIVE, RateLimiter
+from utils.singleflight import SingleFlight
+
+# Ossapi는 동기(requests) 클라이언트라서 그대로 부르면 이벤트 루프 전체가 멈춘다.
+# 모든 호출을 전용 스레드 풀에서 실행하고, 코그에서는 await로 결과만 받는다.
+#   user = await self.bot.osu_api.user("name", mode="osu", key="username")
+#   scores = await self.bot.osu_api.background.user_scores(...)   # 백그라운드 작업은 낮은 우선순위
+# 같은 인자로 동시에 들어온 호출은 SingleFlight로 묶어서 한 번만 보낸다.
+# 요청은 RateLimiter 예산 안에서만 나가고, 429/5xx/연결 오류는 백오프 후 재시도한다.
+# Ossapi 객체는 첫 호출 때 OsuAuth에서 받은 토큰으로 만들고, 토큰이 바뀌면 새로 만든다.
+# 토큰을 받을 수 없으면 OsuUnavailable을 던진다.
+OSU_API_WORKERS = int(os.getenv("OSU_API_WORKERS", "16"))
+OSU_API_RETRIES = int(os.getenv("OSU_API_RETRIES", "3"))
+# 다른 주소의 API를 쓸 때만 설정 (벤치마크용 가짜 서버 등), 비워두면 osu.ppy.sh
+OSU_API_URL = os.getenv("OSU_API_URL")
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 30.0
+
+
+# Ossapi는 HTTP 상태 코드를 보지 않고 바로 JSON을 읽으므로,
+# 재시도할 만한 응답은 requests 단계에서 HTTPError로 바꿔준다
+def _raise_for_retryable(response, *args, **kwargs):
+    if response.status_code == 429 or response.status_code >= 500:
+        response.raise_for_status()
+
+
+def _retry_delay(error, attempt):
+    response = getattr(error, "response", None)
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return min(RETRY_MAX_DELAY, float(retry_after))
+    return min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+def _is_retryable(error):
+    if isinstance(error, requests.HTTPError):
+        return error.response is not None and (error.response.status_code == 429 or error.response.status_code >= 500)
+    return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+
+class _Lane:
+    def __init__(self, api, priority):
+        self._api = api
+        self._priority = priority
+
+    def __getattr__(self, endpoint):
+        if endpoint.startswith("_"):
+            raise AttributeError(endpoint)
+        return functools.partial(self._api.call_with_priority, self._priority, endpoint)
+
+
+class AsyncOsuApi:
+    def __init__(self, auth, max_workers=OSU_API_WORKERS, limiter=None):
+        self.auth = auth
+        self.api = None
+        self._api_token = None
+        self.http_session = None
+        self._refresh_task = None
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="osu-api")
+        self.flight = SingleFlight()
+        self.limiter = limiter or RateLimiter()
+        self.background = _Lane(self, BACKGROUND)
+
+        self.retries = 0
+        self.throttled = 0
+        self._hooked_session = None
+
+    # setup_hook에서 공유 세션을 넘겨받고, 토큰을 백그라운드에서 미리 받아둔다 (봇 시작을 막지 않음)
+    def start(self, http_session):
+        self.http_session = http_session
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self.auth.keep_fresh(http_session))
+
+    async def _client(self):
+        token = await self.auth.get_token(self.http_session)
+        if self.api is None or self._api_token != token:
+            # access_token을 넘기면 Ossapi는 네트워크 요청 없이 세션만 만든다
+            self.api = Ossapi(self.auth.client_id, self.auth.client_secret, access_token=token)
+            if OSU_API_URL:
+                self.api.base_url = OSU_API_URL
+            self._api_token = token
+        return self.api
+
+    def _install_hook(self):
+        # Ossapi가 토큰을 다시 받으면 session 객체가 바뀌므로 그때마다 다시 건다
+        session = getattr(self.api, "session", None)
+        if session is not None and session is not self._hooked_session:
+            session.hooks["response"].append(_raise_for_retryable)
+            self._hooked_session = session
+
+    async def _run(self, priority, endpoint, args, kwargs):
+        loop = asyncio.get_running_loop()
+
+        for attempt in range(OSU_API_RETRIES + 1):
+            api = await self._client()
+            func = getattr(api, endpoint)
+            await self.limiter.acquire(priority)
+            self._install_hook()
+            start = time.perf_counter()
+            try:
+                result = await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+                error = None
+            except Exception as e:
+                error = e
+            metrics.observe("osu_api_seconds", time.perf_counter() - start, endpoint=endpoint)
+            metrics.inc("osu_api_calls", endpoint=endpoint, result="error" if error else "ok")
+            if error is None:
+                return result
+
+            if isinstance(error, ReauthenticationRequired):
+                # 토큰이 서버에서 거부됨 -> 버리고 새 토큰으로 한 번 더
+                self.auth.invalidate(self._api_token)
+                if attempt == OSU_API_RETRIES:
+                    raise OsuUnavailable("osu! 토큰이 만료되었습니다.")
+                self.retries += 1
+                continue
+
+            if attempt == OSU_API_RETRIES or not _is_retryable(error):
+                raise error
+            if isinstance(error, requests.HTTPError) and error.response.status_code == 429:
+                self.throttled += 1
+            self.retries += 1
+            delay = _retry_delay(error, attempt)
+            print(f"osu! API {endpoint} 재시도 {attempt + 1}/{OSU_API_RETRIES} ({delay:.1f}초 후): {error}")
+            await asyncio.sleep(delay)
+
+    async def call_with_priority(self, priority, endpoint, *args, **kwargs):
+        # 리스트 인자(users([...]) 등)도 키로 쓸 수 있게 repr로 만든다
+        key = (priority, endpoint, repr(args), repr(sorted(kwargs.items())))
+        return await self.flight.do(key, self._run, priority, endpoint, args, kwargs)
+
+    async def call(self, endpoint, *args, **kwargs):
+        return await self.call_with_priority(INTERACTIVE, endpoint, *args, **kwargs)
+
+    # self.bot.osu_api.user(...) 처럼 Ossapi와 같은 이름으로 호출할 수 있게 해준다
+    def __getattr__(self, endpoint):
+        if endpoint.startswith("_"):
+            raise AttributeError(endpoint)
+        return functools.partial(self.call, endpoint)
+
+    def stats(self):
+        return {
+            "auth": self.auth.stats(),
+            "limiter": self.limiter.stats(),
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "singleflight": self.flight.stats(),
+        }
+
+    def close(self):
+        if self._refresh_task:
+            self._refresh_task.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,142 @@
+import asyncio
+import json
+import os
+import time
+
+import aiohttp
+
+# osu! API client credentials 토큰 관리.
+# 봇 생성자에서 토큰을 동기로 받지 않고, 처음 필요할 때(또는 setup_hook의 백그라운드 작업에서) 비동기로 받는다.
+# 받은 토큰은 만료 시각과 함께 파일에 저장해서 재시작해도 다시 쓰고, 만료 몇 분 전에 미리 새로 받는다.
+OSU_TOKEN_URL = os.getenv("OSU_TOKEN_URL", "https://osu.ppy.sh/oauth/token")
+OSU_TOKEN_FILE = os.getenv("OSU_TOKEN_FILE", ".osu_token.json")
+TOKEN_REFRESH_MARGIN = 600   # 만료 10분 전부터는 새 토큰을 받는다
+AUTH_RETRY_SECONDS = 30      # 인증 실패 후 이 시간 동안은 바로 '사용 불가'로 응답 (토큰 서버 연타 방지)
+
+
+# osu! API를 쓸 수 없는 상태 (키 미설정, 인증 실패 등). 코그에서 잡아서 안내 메시지로 바꾼다.
+class OsuUnavailable(Exception):
+    pass
+
+
+class OsuAuth:
+    def __init__(self, client_id, client_secret, path=OSU_TOKEN_FILE):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.path = path
+
+        self.access_token = None
+        self.expires_at = 0
+        self.fetched = 0
+        self.last_error = None
+        self._failed_at = 0
+        self._loaded = False
+        self._lock = asyncio.Lock()
+        # 봇 시작 후 첫 토큰 준비에 걸린 시간과 출처 (on_ready에서 시작 시간과 같이 출력)
+        self.first_token = None
+
+    @property
+    def configured(self):
+        return bool(self.client_id and self.client_secret)
+
+    def is_valid(self, now=None):
+        now = now or time.time()
+        return self.access_token is not None and self.expires_at - TOKEN_REFRESH_MARGIN > now
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+        # 다른 앱 키로 받은 토큰이면 쓰지 않는다
+        if str(data.get("client_id")) == str(self.client_id):
+            self.access_token = data.get("access_token")
+            self.expires_at = data.get("expires_at", 0)
+
+    def _save(self):
+        data = {"client_id": str(self.client_id), "access_token": self.access_token, "expires_at": self.expires_at}
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    async def _fetch(self, session):
+        payload = {
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+            "grant_type": "client_credentials",
+            "scope": "public",
+        }
+        requested_at = time.time()
+        if session is None:
+            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=15)) as own_session:
+                async with own_session.post(OSU_TOKEN_URL, json=payload) as resp:
+                    resp.raise_for_status()
+                    data = await resp.json()
+        else:
+            async with session.post(OSU_TOKEN_URL, json=payload) as resp:
+                resp.raise_for_status()
+                data = await resp.json()
+
+        self.access_token = data["access_token"]
+        self.expires_at = requested_at + int(data.get("expires_in", 86400))
+        self.fetched += 1
+        await asyncio.to_thread(self._save)
+
+    # 유효한 토큰을 돌려준다. 받을 수 없으면 OsuUnavailable
+    async def get_token(self, session=None):
+        if self.is_valid():
+            return self.access_token
+        if not self.configured:
+            raise OsuUnavailable("OSU_CLIENT_ID / OSU_CLIENT_SECRET이 설정되지 않았습니다.")
+
+        async with self._lock:
+            if not self._loaded:
+                self._loaded = True
+                await asyncio.to_thread(self._load)
+            if self.is_valid():
+                return self.access_token
+            if time.monotonic() - self._failed_at < AUTH_RETRY_SECONDS:
+                raise OsuUnavailable(f"osu! 인증 실패: {self.last_error}")
+
+            try:
+                await self._fetch(session)
+            except Exception as e:
+                self._failed_at = time.monotonic()
+                self.last_error = e
+                print(f"osu! 토큰 발급 실패: {e}")
+                raise OsuUnavailable(f"osu! 인증 실패: {e}") from e
+
+            self.last_error = None
+            print(f"osu! 토큰 발급 완료 (만료까지 {(self.expires_at - time.time()) / 3600:.1f}시간)")
+            return self.access_token
+
+    # 서버에서 토큰을 거부했을 때 (취소/만료) 다음 호출에서 새로 받게 한다
+    def invalidate(self, token):
+        if self.access_token == token:
+            self.access_token = None
+            self.expires_at = 0
+
+    # 만료 전에 미리 갱신하는 백그라운드 루프 (setup_hook에서 시작)
+    async def keep_fresh(self, session=None):
+        start = time.perf_counter()
+        while True:
+            try:
+                await self.get_token(session)
+                delay = self.expires_at - TOKEN_REFRESH_MARGIN - time.time()
+                source = "새로 발급" if self.fetched else "저장된 토큰"
+            except OsuUnavailable:
+                delay = AUTH_RETRY_SECONDS
+                source = "실패"
+            if self.first_token is None:
+                self.first_token = {"seconds": time.perf_counter() - start, "source": source}
+            await asyncio.sleep(max(AUTH_RETRY_SECONDS, delay))
+
+    def stats(self):
+        return {
+            "available": self.is_valid(),
+            "expires_in": max(0, int(self.expires_at - time.time())),
+            "fetched": self.fetched,
+            "last_error": str(self.last_error) if self.last_error else None,
+        }
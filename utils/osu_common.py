@@ -0,0 +1,9 @@
+import time
+
+# 여러 cog에서 같이 쓰는 값 (cog끼리 서로 import하지 않도록 여기에 둔다)
+MODES = ("osu", "taiko", "fruits", "mania")
+
+
+# 1970-01-01부터 지난 날 수 (stats_history의 day 값)
+def today(now=None):
+    return int((time.time() if now is None else now) // 86400)
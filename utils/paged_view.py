@@ -0,0 +1,47 @@
+import discord
+
+# ◀/▶ 버튼으로 페이지를 넘기는 임베드 (/top, /leaderboard)
+# 하위 클래스는 self.page 페이지의 임베드를 만드는 render()만 구현한다.
+#   view = TopView(...)
+#   await view.send(ctx)
+class PagedView(discord.ui.View):
+    def __init__(self, total_items, page_size, author_id, timeout=180):
+        super().__init__(timeout=timeout)
+        self.pages = max(1, (total_items + page_size - 1) // page_size)
+        self.author_id = author_id
+        self.page = 0
+        self.message = None
+
+    async def render(self):
+        raise NotImplementedError
+
+    async def _page_embed(self):
+        self.prev_page.disabled = self.page == 0
+        self.next_page.disabled = self.page >= self.pages - 1
+        return await self.render()
+
+    async def send(self, ctx):
+        self.message = await ctx.send(embed=await self._page_embed(), view=self)
+
+    async def interaction_check(self, interaction):
+        if interaction.user.id != self.author_id:
+            await interaction.response.send_message("명령어를 쓴 사람만 페이지를 넘길 수 있습니다.", ephemeral=True)
+            return False
+        return True
+
+    @discord.ui.button(label="◀", style=discord.ButtonStyle.secondary)
+    async def prev_page(self, interaction, button):
+        self.page = max(0, self.page - 1)
+        await interaction.response.edit_message(embed=await self._page_embed(), view=self)
+
+    @discord.ui.button(label="▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction, button):
+        self.page = min(self.pages - 1, self.page + 1)
+        await interaction.response.edit_message(embed=await self._page_embed(), view=self)
+
+    async def on_timeout(self):
+        if self.message:
+            try:
+                await self.message.edit(view=None)
+            except discord.HTTPException:
+                pass
@@ -0,0 +1,189 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import rosu_pp_py
+
+from utils.difficulty_cache import ATTR_FIELDS
+from utils.metrics import metrics
+
+# rosu-pp 계산(.osu 파싱 + 난이도/PP 계산)을 별도 프로세스에서 돌리는 서비스
+# 긴 마라톤 맵을 계산하는 동안에도 이벤트 루프(=다른 명령어)가 멈추지 않는다.
+#   result = await self.bot.pp_service.calculate(map_content, beatmap.id, checksum, mode, mods, ...)
+PP_WORKERS = int(os.getenv("PP_WORKERS", str(os.cpu_count() or 2)))
+PP_QUEUE_SIZE = int(os.getenv("PP_QUEUE_SIZE", "64"))
+PP_JOB_TIMEOUT = float(os.getenv("PP_JOB_TIMEOUT", "10"))
+WORKER_ATTRS_CACHE_SIZE = 128
+
+# 기록의 모드(osu API 이름) -> rosu 게임 모드
+RULESETS = {
+    "osu": rosu_pp_py.GameMode.Osu,
+    "taiko": rosu_pp_py.GameMode.Taiko,
+    "fruits": rosu_pp_py.GameMode.Catch,
+    "mania": rosu_pp_py.GameMode.Mania,
+}
+
+
+class PPQueueFull(Exception):
+    pass
+
+
+# ------------------------------------------
+# 워커 프로세스 쪽
+# ------------------------------------------
+# rosu 난이도 속성 객체는 프로세스 밖으로 꺼낼 수 없으므로 워커마다 LRU로 들고 있는다
+_attrs_cache = OrderedDict()
+
+
+# osu!standard 맵을 다른 모드로 한 기록(컨버트)은 맵을 그 모드로 바꾼 뒤에 계산해야 한다
+# (그대로 계산하면 taiko/catch/mania 기록에 osu!standard PP가 나옴)
+def _parse(map_content, mode):
+    rosu_map = rosu_pp_py.Beatmap(bytes=map_content)
+    rosu_map.convert(RULESETS[mode])
+    return rosu_map
+
+
+def _difficulty(map_content, key, mode, mods):
+    attrs = _attrs_cache.get(key)
+    if attrs is None:
+        attrs = rosu_pp_py.Difficulty(mods=mods).calculate(_parse(map_content, mode))
+        _attrs_cache[key] = attrs
+        while len(_attrs_cache) > WORKER_ATTRS_CACHE_SIZE:
+            _attrs_cache.popitem(last=False)
+    else:
+        _attrs_cache.move_to_end(key)
+    return attrs
+
+
+# 난이도 속성 객체에서 DifficultyCache에 저장할 숫자 값만 꺼낸다
+def difficulty_values(attrs):
+    return {name: getattr(attrs, name, None) for name in ATTR_FIELDS}
+
+
+def _performance(attrs, mods, accuracy, combo, misses, max_combo):
+    fc_combo = max_combo or attrs.max_combo
+    pp = rosu_pp_py.Performance(accuracy=accuracy, mods=mods, misses=misses, combo=combo).calculate(attrs).pp
+    if_fc_pp = rosu_pp_py.Performance(accuracy=accuracy, mods=mods, misses=0, combo=fc_combo).calculate(attrs).pp
+    return {
+        "pp": pp,
+        "if_fc_pp": if_fc_pp,
+        "max_combo": int(attrs.max_combo),
+        "difficulty": difficulty_values(attrs),
+    }
+
+
+def _calculate(map_content, beatmap_id, checksum, mode, mods, accuracy, combo, misses, max_combo):
+    start = time.perf_counter()
+    attrs = _difficulty(map_content, (beatmap_id, checksum, mode, mods), mode, mods)
+    result = _performance(attrs, mods, accuracy, combo, misses, max_combo)
+    # 대기 시간을 뺀 워커 안에서의 실제 rosu 계산 시간
+    result["calc_seconds"] = time.perf_counter() - start
+    return result
+
+
+# 같은 맵의 기록 여러 개 (/compare): 맵은 한 번만 파싱하고 모드 조합별 난이도도 한 번씩만 계산
+# jobs: [(mods, accuracy, combo, misses, max_combo), ...]
+def _calculate_many(map_content, beatmap_id, checksum, mode, jobs):
+    start = time.perf_counter()
+    rosu_map = None
+    results = []
+    for mods, accuracy, combo, misses, max_combo in jobs:
+        key = (beatmap_id, checksum, mode, mods)
+        attrs = _attrs_cache.get(key)
+        if attrs is None:
+            if rosu_map is None:
+                rosu_map = _parse(map_content, mode)
+            attrs = _attrs_cache[key] = rosu_pp_py.Difficulty(mods=mods).calculate(rosu_map)
+            while len(_attrs_cache) > WORKER_ATTRS_CACHE_SIZE:
+                _attrs_cache.popitem(last=False)
+        results.append(_performance(attrs, mods, accuracy, combo, misses, max_combo))
+    return {"results": results, "calc_seconds": time.perf_counter() - start}
+
+
+# ------------------------------------------
+# 봇(이벤트 루프) 쪽
+# ------------------------------------------
+class PPService:
+    def __init__(self, workers=PP_WORKERS, queue_size=PP_QUEUE_SIZE, timeout=PP_JOB_TIMEOUT):
+        self.workers = workers
+        self.max_pending = workers + queue_size
+        self.timeout = timeout
+        self._executor = ProcessPoolExecutor(max_workers=workers)
+
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._latencies = deque(maxlen=1000)
+
+    async def _submit(self, func, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PPQueueFull(f"PP 계산 대기열이 가득 찼습니다 ({self.pending}/{self.max_pending})")
+
+        loop = asyncio.get_running_loop()
+        job = self._executor.submit(func, *args)
+        # 자리는 기다리던 쪽이 포기할 때가 아니라 워커에서 작업이 실제로 끝날 때(또는 시작 전에 취소될 때) 반납한다
+        # (시간 초과 뒤에도 계속 도는 긴 맵 작업까지 max_pending에 포함되게)
+        self.pending += 1
+        job.add_done_callback(lambda _: self._job_done_threadsafe(loop))
+
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(job), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            # 아직 시작 안 한 작업은 취소되고, 이미 도는 작업은 결과만 버린다
+            self.timed_out += 1
+            raise
+
+        elapsed = time.perf_counter() - start
+        self._latencies.append(elapsed)
+        self.completed += 1
+        metrics.observe("pp_job_seconds", elapsed)
+        metrics.observe("rosu_calc_seconds", result["calc_seconds"])
+        return result
+
+    def _job_done(self):
+        self.pending -= 1
+
+    # 작업 완료 콜백은 executor 쪽 스레드에서 불리므로 루프로 넘긴다 (종료 중이라 루프가 닫혔으면 무시)
+    def _job_done_threadsafe(self, loop):
+        try:
+            loop.call_soon_threadsafe(self._job_done)
+        except RuntimeError:
+            pass
+
+    # mode: 기록의 모드 ("osu", "taiko", "fruits", "mania")
+    async def calculate(self, map_content, beatmap_id, checksum, mode, mods, accuracy, combo, misses, max_combo=None):
+        return await self._submit(_calculate, map_content, beatmap_id, checksum, mode, mods, accuracy, combo, misses, max_combo)
+
+    # 같은 맵의 기록 여러 개를 작업 하나로 계산. 결과는 jobs 순서대로
+    async def calculate_many(self, map_content, beatmap_id, checksum, mode, jobs):
+        result = await self._submit(_calculate_many, map_content, beatmap_id, checksum, mode, jobs)
+        return result["results"]
+
+    # 대기열 길이(실행 중 포함)와 최근 작업 지연 시간(초)
+    def stats(self):
+        latencies = sorted(self._latencies)
+
+        def percentile(p):
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "queued": max(0, self.pending - self.workers),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "p50": percentile(0.50),
+            "p95": percentile(0.95),
+            "p99": percentile(0.99),
+        }
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,62 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+
+# (유저 ID 또는 닉네임, 모드) 별 프로필 캐시 (stale-while-revalidate)
+# - TTL 안이면 캐시를 그대로 돌려준다
+# - TTL이 지났으면 일단 캐시를 돌려주고 백그라운드에서 새로 받아온다
+# - 캐시에 없을 때만 API 응답을 기다린다
+PROFILE_CACHE_TTL = int(os.getenv("PROFILE_CACHE_TTL", "180"))
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "2048"))
+
+
+class ProfileCache:
+    def __init__(self, fetch, ttl=PROFILE_CACHE_TTL, max_entries=PROFILE_CACHE_SIZE):
+        # fetch: async def fetch(user, mode) -> ossapi User  (user: osu! ID(int) 또는 닉네임)
+        self.fetch = fetch
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._refreshing = {}
+
+    def _store(self, key, profile):
+        self._entries[key] = (profile, time.time())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def _refresh(self, key, user, mode):
+        try:
+            self._store(key, await self.fetch(user, mode))
+        except Exception as e:
+            print(f"프로필 갱신 실패 ({user}): {e}")
+        finally:
+            self._refreshing.pop(key, None)
+
+    # (프로필, 데이터 나이(초)) 를 돌려준다
+    async def get(self, user, mode="osu"):
+        key = (user.lower() if isinstance(user, str) else user, mode)
+        entry = self._entries.get(key)
+
+        if entry is None:
+            self.misses += 1
+            profile = await self.fetch(user, mode)
+            self._store(key, profile)
+            return profile, 0.0
+
+        profile, fetched_at = entry
+        self._entries.move_to_end(key)
+        age = time.time() - fetched_at
+
+        if age > self.ttl:
+            self.stale_hits += 1
+            if key not in self._refreshing:
+                self._refreshing[key] = asyncio.create_task(self._refresh(key, user, mode))
+        else:
+            self.hits += 1
+        return profile, age
+
@@ -0,0 +1,88 @@
+import asyncio
+import os
+import time
+from collections import deque
+
+# osu! API 요청 예산을 지키는 토큰 버킷
+# - 분당 OSU_API_RPM개의 토큰이 일정하게 채워지고, 최대 OSU_API_BURST개까지 모아둘 수 있다
+# - 토큰이 없으면 줄을 서서 기다린다. 명령어(INTERACTIVE) 줄이 항상 백그라운드 줄보다 먼저 나간다
+#   await limiter.acquire(INTERACTIVE)
+OSU_API_RPM = int(os.getenv("OSU_API_RPM", "60"))
+OSU_API_BURST = int(os.getenv("OSU_API_BURST", "10"))
+
+INTERACTIVE = 0
+BACKGROUND = 1
+LANE_NAMES = ("interactive", "background")
+
+
+class RateLimiter:
+    def __init__(self, per_minute=OSU_API_RPM, burst=OSU_API_BURST):
+        self.rate = per_minute / 60
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lanes = (deque(), deque())
+        self._dispatcher = None
+
+        self.granted = [0, 0]
+        self._waits = (deque(maxlen=500), deque(maxlen=500))
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _next_waiter(self):
+        for lane in self._lanes:
+            while lane:
+                future = lane.popleft()
+                if not future.done():
+                    return future
+        return None
+
+    async def _dispatch(self):
+        try:
+            while True:
+                self._refill()
+                while self.tokens >= 1:
+                    future = self._next_waiter()
+                    if future is None:
+                        return
+                    self.tokens -= 1
+                    future.set_result(None)
+                if not any(self._lanes):
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+        finally:
+            self._dispatcher = None
+
+    async def acquire(self, priority=INTERACTIVE):
+        start = time.monotonic()
+        self._refill()
+
+        # 기다리는 사람이 없고 토큰이 남아있으면 바로 통과
+        if self.tokens >= 1 and not any(self._lanes):
+            self.tokens -= 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._lanes[priority].append(future)
+            if self._dispatcher is None:
+                self._dispatcher = asyncio.create_task(self._dispatch())
+            await future
+
+        self.granted[priority] += 1
+        self._waits[priority].append(time.monotonic() - start)
+
+    # 현재 남은 예산과 줄별 대기 상황 (대기 시간은 초)
+    def stats(self):
+        self._refill()
+        result = {"tokens": round(self.tokens, 2), "capacity": self.capacity, "per_minute": self.rate * 60}
+        for priority, name in enumerate(LANE_NAMES):
+            waits = sorted(self._waits[priority])
+            result[name] = {
+                "queued": sum(1 for future in self._lanes[priority] if not future.done()),
+                "granted": self.granted[priority],
+                "avg_wait": sum(waits) / len(waits) if waits else 0.0,
+                "p95_wait": waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else 0.0,
+            }
+        return result
@@ -0,0 +1,26 @@
+import asyncio
+
+# 같은 키로 동시에 들어온 요청은 처음 요청 하나만 실제로 실행하고
+# 나머지는 그 결과(또는 예외)를 같이 받아간다.
+#   user = await flight.do(("user", name), fetch_user, name)
+class SingleFlight:
+    def __init__(self):
+        self._inflight = {}
+        self.calls = 0
+        self.deduplicated = 0
+
+    async def do(self, key, func, *args, **kwargs):
+        task = self._inflight.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(func(*args, **kwargs))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.deduplicated += 1
+
+        # 기다리던 한 명이 취소되어도 다른 사람 몫의 요청은 계속 진행
+        return await asyncio.shield(task)
+
+    def stats(self):
+        return {"calls": self.calls, "deduplicated": self.deduplicated, "in_flight": len(self._inflight)}
@@ -0,0 +1,395 @@
+import asyncio
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+# 봇 DB(osu_bot.db) 접근 모듈
+# - WAL 모드: 쓰는 동안에도 읽기가 막히지 않는다
+# - 모든 쿼리는 전용 스레드 하나에서 순서대로 실행 (이벤트 루프를 막지 않고, 커서가 섞이지 않음)
+# - SQL 문자열은 상수로만 쓰고 sqlite3의 prepared statement 캐시를 재사용
+# - discord_id -> 연동 계정은 메모리에 들고 있다가 link 할 때 같이 갱신
+DB_PATH = "osu_bot.db"
+
+# 연동 안 된 유저도 캐시해서 매번 DB를 보지 않게 하기 위한 표시
+NOT_LINKED = object()
+
+SELECT_ACCOUNT = "SELECT osu_user_id, osu_username, mode FROM users WHERE discord_id = ?"
+UPSERT_ACCOUNT = "REPLACE INTO users (discord_id, osu_username, osu_user_id, mode) VALUES (?, ?, ?, ?)"
+
+INSERT_GUILD_LINK = "INSERT OR IGNORE INTO guild_links (guild_id, discord_id) VALUES (?, ?)"
+UPSERT_TRACK_CHANNEL = "REPLACE INTO track_channels (guild_id, channel_id) VALUES (?, ?)"
+DELETE_TRACK_CHANNEL = "DELETE FROM track_channels WHERE guild_id = ?"
+# 알림 채널이 있는 서버에 연동된 유저만 추적 대상으로 등록
+SYNC_TRACKED_USERS = """
+    INSERT OR IGNORE INTO tracked_users (osu_user_id, mode, next_check)
+    SELECT DISTINCT u.osu_user_id, COALESCE(u.mode, 'osu'), 0
+    FROM users u
+    JOIN guild_links g ON g.discord_id = u.discord_id
+    JOIN track_channels t ON t.guild_id = g.guild_id
+    WHERE u.osu_user_id IS NOT NULL
+"""
+# 더 이상 join에 걸리지 않는 추적 대상 삭제 (?untrack, 봇이 서버에서 나감, 다른 계정/모드로 다시 연동)
+# 다시 조건에 맞으면 SYNC_TRACKED_USERS가 새 줄로 넣는다
+PRUNE_TRACKED_USERS = """
+    DELETE FROM tracked_users WHERE NOT EXISTS (
+        SELECT 1
+        FROM users u
+        JOIN guild_links g ON g.discord_id = u.discord_id
+        JOIN track_channels t ON t.guild_id = g.guild_id
+        WHERE u.osu_user_id = tracked_users.osu_user_id AND COALESCE(u.mode, 'osu') = tracked_users.mode
+    )
+"""
+SELECT_DUE_TRACKED = """
+    SELECT osu_user_id, mode, play_count, last_score_id, last_played, checked_at
+    FROM tracked_users WHERE next_check <= ? ORDER BY next_check LIMIT ?
+"""
+UPDATE_TRACKED = """
+    UPDATE tracked_users
+    SET play_count = ?, last_score_id = ?, last_played = ?, checked_at = ?, next_check = ?
+    WHERE osu_user_id = ?
+"""
+# 이 서버 연결이 아직 없는 연동 유저 (서버 연결 기록이 생기기 전에 연동한 예전 계정 채우기용)
+SELECT_GUILD_LINK_CANDIDATES = """
+    SELECT discord_id FROM users
+    WHERE discord_id NOT IN (SELECT discord_id FROM guild_links WHERE guild_id = ?)
+"""
+# 예전 스키마에서 넘어와 osu! ID를 아직 모르는 이 서버 멤버
+SELECT_GUILD_UNRESOLVED = """
+    SELECT u.discord_id
+    FROM guild_links g
+    JOIN users u ON u.discord_id = g.discord_id
+    WHERE g.guild_id = ? AND u.osu_user_id IS NULL
+"""
+SELECT_GUILD_ACCOUNTS = """
+    SELECT DISTINCT u.osu_user_id
+    FROM guild_links g
+    JOIN users u ON u.discord_id = g.discord_id
+    WHERE g.guild_id = ? AND u.osu_user_id IS NOT NULL
+"""
+UPSERT_SNAPSHOT = """
+    REPLACE INTO user_snapshots (osu_user_id, mode, username, pp, global_rank, accuracy, play_count, fetched_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+# 랭킹 정렬 기준 (ORDER BY에는 이 값만 들어간다)
+LEADERBOARD_ORDERS = {
+    "pp": "s.pp DESC",
+    "rank": "s.global_rank IS NULL, s.global_rank ASC",
+    "accuracy": "s.accuracy DESC",
+    "playcount": "s.play_count DESC",
+}
+SELECT_LEADERBOARD = """
+    SELECT s.osu_user_id, s.username, s.pp, s.global_rank, s.accuracy, s.play_count, s.fetched_at
+    FROM user_snapshots s
+    WHERE s.mode = ? AND s.osu_user_id IN (
+        SELECT u.osu_user_id FROM guild_links g JOIN users u ON u.discord_id = g.discord_id WHERE g.guild_id = ?
+    )
+    ORDER BY {order}, s.osu_user_id
+    LIMIT ? OFFSET ?
+"""
+SELECT_SNAPSHOT_TIMES = "SELECT osu_user_id, fetched_at FROM user_snapshots WHERE mode = ? AND osu_user_id IN ({placeholders})"
+UPSERT_HISTORY = "REPLACE INTO stats_history (osu_user_id, mode, day, pp, global_rank) VALUES (?, ?, ?, ?, ?)"
+SELECT_HISTORY = """
+    SELECT day, pp, global_rank FROM stats_history
+    WHERE osu_user_id = ? AND mode = ? AND day >= ?
+    ORDER BY day
+"""
+# 기간 안의 기록은 (유저, 모드, 주) 마다 마지막 날 하나만 남긴다
+# (날짜 범위는 idx_stats_history_day로 찾고, 같은 주에 더 늦은 날 기록이 있는지는 기본 키로 확인)
+DOWNSAMPLE_HISTORY = """
+    DELETE FROM stats_history
+    WHERE day >= ? AND day < ? AND EXISTS (
+        SELECT 1 FROM stats_history later
+        WHERE later.osu_user_id = stats_history.osu_user_id
+          AND later.mode = stats_history.mode
+          AND later.day > stats_history.day
+          AND later.day < (stats_history.day / 7 + 1) * 7
+    )
+"""
+# 봇 상태 값 (재시작해도 남아야 하는 작업 진행 위치 등)
+SELECT_STATE = "SELECT value FROM bot_state WHERE key = ?"
+UPSERT_STATE = "REPLACE INTO bot_state (key, value) VALUES (?, ?)"
+# 이 날 이전 기록은 이미 주 단위로 줄였음 (다음 정리는 여기서부터)
+HISTORY_DOWNSAMPLED_DAY = "history_downsampled_day"
+# 이 서버의 예전 연동 계정 채우기를 끝냈음 (뒤에 서버 ID)
+GUILD_LINKS_BACKFILLED = "guild_links_backfilled:{guild_id}"
+SELECT_ANNOUNCE_CHANNELS = """
+    SELECT DISTINCT t.channel_id
+    FROM users u
+    JOIN guild_links g ON g.discord_id = u.discord_id
+    JOIN track_channels t ON t.guild_id = g.guild_id
+    WHERE u.osu_user_id = ?
+"""
+
+
+class Storage:
+    def __init__(self, path=DB_PATH):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="storage")
+        self._accounts = {}
+        self._guild_links = set()
+        self.conn = None
+        # 연결도 DB 스레드에서 만들어서 모든 접근이 같은 스레드에서 일어나게 한다
+        self._executor.submit(self._open, path).result()
+
+    def _open(self, path):
+        self.conn = sqlite3.connect(path, cached_statements=256)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS users (
+                discord_id INTEGER PRIMARY KEY,
+                osu_username TEXT,
+                osu_user_id INTEGER,
+                mode TEXT DEFAULT 'osu'
+            )
+        """)
+
+        # 예전 DB(osu_username만 있던 스키마) 마이그레이션
+        # osu_user_id는 비워두고, 그 계정을 처음 조회할 때 채워 넣는다 (Osu.get_linked_account)
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(users)")]
+        if "osu_user_id" not in columns:
+            self.conn.execute("ALTER TABLE users ADD COLUMN osu_user_id INTEGER")
+        if "mode" not in columns:
+            self.conn.execute("ALTER TABLE users ADD COLUMN mode TEXT DEFAULT 'osu'")
+
+        # 어느 서버에서 연동/사용했는지 (서버별 알림, 랭킹용)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS guild_links (
+                guild_id INTEGER,
+                discord_id INTEGER,
+                PRIMARY KEY (guild_id, discord_id)
+            )
+        """)
+        # 서버별 기록 알림 채널
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS track_channels (
+                guild_id INTEGER PRIMARY KEY,
+                channel_id INTEGER
+            )
+        """)
+        # 기록 추적 커서 (utils/tracker.py)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS tracked_users (
+                osu_user_id INTEGER PRIMARY KEY,
+                mode TEXT DEFAULT 'osu',
+                play_count INTEGER,
+                last_score_id INTEGER,
+                last_played REAL,
+                checked_at REAL,
+                next_check REAL DEFAULT 0
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_tracked_next_check ON tracked_users (next_check)")
+        # 서버 랭킹용 유저 통계 스냅샷 (cogs/leaderboard.py)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS user_snapshots (
+                osu_user_id INTEGER,
+                mode TEXT,
+                username TEXT,
+                pp REAL,
+                global_rank INTEGER,
+                accuracy REAL,
+                play_count INTEGER,
+                fetched_at REAL,
+                PRIMARY KEY (osu_user_id, mode)
+            )
+        """)
+        # PP/랭킹 변화 기록: 유저+모드별 하루 한 줄 (day = 1970-01-01부터 지난 날 수)
+        # WITHOUT ROWID라서 (유저, 모드, 날짜) 순서로 붙어 저장되고, 한 유저 기간 조회는 범위 스캔 한 번
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS stats_history (
+                osu_user_id INTEGER,
+                mode TEXT,
+                day INTEGER,
+                pp REAL,
+                global_rank INTEGER,
+                PRIMARY KEY (osu_user_id, mode, day)
+            ) WITHOUT ROWID
+        """)
+        # 기록 정리(DOWNSAMPLE_HISTORY)의 날짜 범위 조회용
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_stats_history_day ON stats_history (day)")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS bot_state (
+                key TEXT PRIMARY KEY,
+                value
+            )
+        """)
+        self.conn.commit()
+
+    async def run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    # ==========================================
+    # 계정 연동 (users)
+    # ==========================================
+    def _select_account(self, discord_id):
+        return self.conn.execute(SELECT_ACCOUNT, (discord_id,)).fetchone()
+
+    def _upsert_account(self, discord_id, osu_user_id, osu_username, mode):
+        self.conn.execute(UPSERT_ACCOUNT, (discord_id, osu_username, osu_user_id, mode))
+        self.conn.commit()
+
+    # (osu_user_id, osu_username, mode) 또는 None
+    async def get_account(self, discord_id):
+        account = self._accounts.get(discord_id)
+        if account is None:
+            row = await self.run(self._select_account, discord_id)
+            account = (row[0], row[1], row[2] or "osu") if row else NOT_LINKED
+            # 조회하는 사이에 set_account가 먼저 끝났으면 그 값을 유지
+            account = self._accounts.setdefault(discord_id, account)
+        return None if account is NOT_LINKED else account
+
+    async def set_account(self, discord_id, osu_user_id, osu_username, mode="osu"):
+        await self.run(self._upsert_account, discord_id, osu_user_id, osu_username, mode)
+        self._accounts[discord_id] = (osu_user_id, osu_username, mode)
+
+    # ==========================================
+    # 서버 연결 / 기록 추적
+    # ==========================================
+    def _insert_guild_link(self, guild_id, discord_id):
+        self.conn.execute(INSERT_GUILD_LINK, (guild_id, discord_id))
+        self.conn.commit()
+
+    async def add_guild_link(self, guild_id, discord_id):
+        key = (guild_id, discord_id)
+        if key in self._guild_links:
+            return
+        await self.run(self._insert_guild_link, guild_id, discord_id)
+        self._guild_links.add(key)
+
+    def _set_track_channel(self, guild_id, channel_id):
+        if channel_id is None:
+            self.conn.execute(DELETE_TRACK_CHANNEL, (guild_id,))
+        else:
+            self.conn.execute(UPSERT_TRACK_CHANNEL, (guild_id, channel_id))
+        self.conn.commit()
+
+    # channel_id가 None이면 알림 끄기
+    async def set_track_channel(self, guild_id, channel_id):
+        await self.run(self._set_track_channel, guild_id, channel_id)
+
+    def _due_tracked_users(self, now, limit):
+        self.conn.execute(PRUNE_TRACKED_USERS)
+        self.conn.execute(SYNC_TRACKED_USERS)
+        self.conn.commit()
+        return self.conn.execute(SELECT_DUE_TRACKED, (now, limit)).fetchall()
+
+    # 지금 확인할 차례인 추적 대상
+    # [(osu_user_id, mode, play_count, last_score_id, last_played, checked_at), ...]
+    async def due_tracked_users(self, now, limit):
+        return await self.run(self._due_tracked_users, now, limit)
+
+    def _update_tracked_users(self, rows):
+        self.conn.executemany(UPDATE_TRACKED, rows)
+        self.conn.commit()
+
+    # rows: [(play_count, last_score_id, last_played, checked_at, next_check, osu_user_id), ...]
+    async def update_tracked_users(self, rows):
+        await self.run(self._update_tracked_users, rows)
+
+    def _announce_channels(self, osu_user_id):
+        return [row[0] for row in self.conn.execute(SELECT_ANNOUNCE_CHANNELS, (osu_user_id,))]
+
+    async def announce_channels(self, osu_user_id):
+        return await self.run(self._announce_channels, osu_user_id)
+
+    # ==========================================
+    # 서버 랭킹 스냅샷
+    # ==========================================
+    def _guild_accounts(self, guild_id):
+        return [row[0] for row in self.conn.execute(SELECT_GUILD_ACCOUNTS, (guild_id,))]
+
+    # 서버에 연동된 osu! 유저 ID 목록
+    async def guild_accounts(self, guild_id):
+        return await self.run(self._guild_accounts, guild_id)
+
+    def _guild_link_candidates(self, guild_id):
+        if self.conn.execute(SELECT_STATE, (GUILD_LINKS_BACKFILLED.format(guild_id=guild_id),)).fetchone():
+            return []
+        return [row[0] for row in self.conn.execute(SELECT_GUILD_LINK_CANDIDATES, (guild_id,))]
+
+    # 이 서버 멤버인지 확인해볼 연동 유저 discord_id 목록 (서버마다 한 번만, 끝냈으면 빈 목록)
+    async def guild_link_candidates(self, guild_id):
+        return await self.run(self._guild_link_candidates, guild_id)
+
+    def _finish_guild_backfill(self, guild_id, discord_ids):
+        self.conn.executemany(INSERT_GUILD_LINK, [(guild_id, discord_id) for discord_id in discord_ids])
+        self.conn.execute(UPSERT_STATE, (GUILD_LINKS_BACKFILLED.format(guild_id=guild_id), 1))
+        self.conn.commit()
+
+    # 확인된 멤버를 서버 연결로 저장하고 이 서버는 채우기 끝으로 표시
+    async def finish_guild_backfill(self, guild_id, discord_ids):
+        await self.run(self._finish_guild_backfill, guild_id, discord_ids)
+        self._guild_links.update((guild_id, discord_id) for discord_id in discord_ids)
+
+    def _guild_unresolved(self, guild_id):
+        return [row[0] for row in self.conn.execute(SELECT_GUILD_UNRESOLVED, (guild_id,))]
+
+    # osu! ID가 비어있는 이 서버 멤버의 discord_id 목록
+    async def guild_unresolved(self, guild_id):
+        return await self.run(self._guild_unresolved, guild_id)
+
+    def _snapshot_times(self, osu_user_ids, mode):
+        result = {}
+        # SQLite 변수 개수 제한 때문에 나눠서 조회
+        for i in range(0, len(osu_user_ids), 500):
+            chunk = osu_user_ids[i:i + 500]
+            sql = SELECT_SNAPSHOT_TIMES.format(placeholders=", ".join("?" for _ in chunk))
+            result.update(self.conn.execute(sql, (mode, *chunk)).fetchall())
+        return result
+
+    # {osu_user_id: fetched_at}
+    async def snapshot_times(self, osu_user_ids, mode):
+        return await self.run(self._snapshot_times, osu_user_ids, mode)
+
+    def _save_snapshots(self, rows):
+        self.conn.executemany(UPSERT_SNAPSHOT, rows)
+        self.conn.commit()
+
+    # rows: [(osu_user_id, mode, username, pp, global_rank, accuracy, play_count, fetched_at), ...]
+    async def save_snapshots(self, rows):
+        await self.run(self._save_snapshots, rows)
+
+    def _leaderboard_page(self, guild_id, mode, order, offset, limit):
+        sql = SELECT_LEADERBOARD.format(order=LEADERBOARD_ORDERS[order])
+        return self.conn.execute(sql, (mode, guild_id, limit, offset)).fetchall()
+
+    # [(osu_user_id, username, pp, global_rank, accuracy, play_count, fetched_at), ...]
+    async def leaderboard_page(self, guild_id, mode, order, offset, limit):
+        return await self.run(self._leaderboard_page, guild_id, mode, order, offset, limit)
+
+    # ==========================================
+    # PP/랭킹 변화 기록
+    # ==========================================
+    def _record_history(self, rows):
+        self.conn.executemany(UPSERT_HISTORY, rows)
+        self.conn.commit()
+
+    # rows: [(osu_user_id, mode, day, pp, global_rank), ...]  같은 날 기록은 마지막 값으로 덮어쓴다
+    async def record_history(self, rows):
+        await self.run(self._record_history, rows)
+
+    def _history(self, osu_user_id, mode, since_day):
+        return self.conn.execute(SELECT_HISTORY, (osu_user_id, mode, since_day)).fetchall()
+
+    # [(day, pp, global_rank), ...]
+    async def history(self, osu_user_id, mode, since_day):
+        return await self.run(self._history, osu_user_id, mode, since_day)
+
+    def _downsample_history(self, before_day):
+        row = self.conn.execute(SELECT_STATE, (HISTORY_DOWNSAMPLED_DAY,)).fetchone()
+        from_day = row[0] if row else 0
+        deleted = self.conn.execute(DOWNSAMPLE_HISTORY, (from_day, before_day)).rowcount
+        # 경계에 걸친 주는 다음 정리 때 다시 본다
+        self.conn.execute(UPSERT_STATE, (HISTORY_DOWNSAMPLED_DAY, max(from_day, before_day - 7)))
+        self.conn.commit()
+        return deleted
+
+    # 지난번 정리한 곳부터 before_day 미만 기록을 주 단위로 줄인다
+    # (진행 위치는 DB에 저장하므로 재시작해도 전체 표를 다시 훑지 않는다)
+    async def downsample_history(self, before_day):
+        return await self.run(self._downsample_history, before_day)
+
+    def close(self):
+        self._executor.submit(self.conn.close).result()
+        self._executor.shutdown()
@@ -0,0 +1,131 @@
+import asyncio
+import os
+import time
+
+# 연동된 유저들의 새 탑 플레이를 찾는 백그라운드 추적기
+# 유저마다 user_scores를 부르지 않고,
+#   1) users([...])로 50명씩 묶어서 플레이 횟수만 확인하고
+#   2) 플레이 횟수가 늘어난 유저만 최근 기록을 받고
+#   3) 새 기록 중 PP가 있는 게 있을 때만 베스트 기록을 받아서 탑 플레이인지 확인한다.
+# 최근에 플레이한 유저는 자주, 오래 안 한 유저는 드물게 확인한다 (POLL_INTERVALS).
+# 모든 요청은 osu_api.background(낮은 우선순위)로 보내고 동시 요청 수도 제한한다.
+TRACKER_TICK_SECONDS = int(os.getenv("TRACKER_TICK_SECONDS", "60"))
+TRACKER_BATCH_LIMIT = int(os.getenv("TRACKER_BATCH_LIMIT", "500"))
+TRACKER_CONCURRENCY = int(os.getenv("TRACKER_CONCURRENCY", "4"))
+USERS_PER_CALL = 50
+TOP_PLAYS = 100
+
+# (마지막 플레이 후 지난 시간, 다음 확인까지 간격) 초 단위
+POLL_INTERVALS = (
+    (60 * 60, 2 * 60),
+    (24 * 60 * 60, 10 * 60),
+    (7 * 24 * 60 * 60, 60 * 60),
+)
+IDLE_INTERVAL = 6 * 60 * 60
+
+
+def poll_interval(idle_seconds):
+    for limit, interval in POLL_INTERVALS:
+        if idle_seconds < limit:
+            return interval
+    return IDLE_INTERVAL
+
+
+class ScoreTracker:
+    def __init__(self, api, storage, concurrency=TRACKER_CONCURRENCY):
+        self.api = api
+        self.storage = storage
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+        self.checked = 0
+        self.api_calls = 0
+        self.announced = 0
+
+    async def _request(self, endpoint, *args, **kwargs):
+        async with self._semaphore:
+            self.api_calls += 1
+            return await getattr(self.api.background, endpoint)(*args, **kwargs)
+
+    # 한 번 돌 때마다 확인할 차례인 유저만 확인하고, 새 탑 플레이 [(user, score, 순위), ...]를 돌려준다
+    async def tick(self, now=None):
+        now = now or time.time()
+        rows = await self.storage.due_tracked_users(now, TRACKER_BATCH_LIMIT)
+        if not rows:
+            return []
+
+        chunks = [rows[i:i + USERS_PER_CALL] for i in range(0, len(rows), USERS_PER_CALL)]
+        results = await asyncio.gather(*[self._check_chunk(chunk, now) for chunk in chunks], return_exceptions=True)
+
+        updates, new_plays = [], []
+        for result in results:
+            if isinstance(result, Exception):
+                print(f"기록 추적 오류: {result}")
+                continue
+            updates.extend(result[0])
+            new_plays.extend(result[1])
+
+        await self.storage.update_tracked_users(updates)
+        self.checked += len(updates)
+        self.announced += len(new_plays)
+        return new_plays
+
+    async def _check_chunk(self, chunk, now):
+        users = await self._request("users", [row[0] for row in chunk])
+        by_id = {user.id: user for user in users}
+
+        updates, changed = [], []
+        for row in chunk:
+            osu_user_id, mode, play_count, last_score_id, last_played, checked_at = row
+            user = by_id.get(osu_user_id)
+            stats = getattr(getattr(user, "statistics_rulesets", None), mode or "osu", None)
+
+            if stats is None:
+                # 정지/삭제된 유저 등: 드물게만 다시 확인
+                updates.append((play_count, last_score_id, last_played, now, now + IDLE_INTERVAL, osu_user_id))
+                continue
+
+            if last_played is None and getattr(user, "last_visit", None):
+                last_played = user.last_visit.timestamp()
+
+            if play_count is not None and stats.play_count > play_count:
+                changed.append((row, user, stats.play_count))
+            else:
+                idle = now - last_played if last_played else float("inf")
+                updates.append((stats.play_count, last_score_id, last_played, now, now + poll_interval(idle), osu_user_id))
+
+        new_plays = []
+        results = await asyncio.gather(*[self._check_user(row, user, count, now) for row, user, count in changed], return_exceptions=True)
+        for (row, _, _), result in zip(changed, results):
+            if isinstance(result, Exception):
+                # 실패하면 커서는 그대로 두고 다음 차례에 다시 시도
+                print(f"기록 추적 오류 ({row[0]}): {result}")
+                updates.append((row[2], row[3], row[4], now, now + poll_interval(0), row[0]))
+                continue
+            updates.append(result[0])
+            new_plays.extend(result[1])
+        return updates, new_plays
+
+    async def _check_user(self, row, user, play_count, now):
+        osu_user_id, mode, old_play_count, last_score_id, _, checked_at = row
+        limit = min(50, max(5, play_count - old_play_count))
+        recent = await self._request("user_scores", osu_user_id, type="recent", mode=mode, limit=limit)
+
+        # 커서(마지막으로 본 기록 ID)보다 새 기록만. 커서가 없으면 지난번 확인 이후 기록
+        if last_score_id:
+            fresh = [score for score in recent if score.id > last_score_id]
+        else:
+            fresh = [score for score in recent if score.ended_at and score.ended_at.timestamp() > (checked_at or now)]
+        cursor = max([score.id for score in recent] + [last_score_id or 0]) or None
+
+        new_plays = []
+        if any(score.pp for score in fresh):
+            best = await self._request("user_scores", osu_user_id, type="best", mode=mode, limit=TOP_PLAYS)
+            fresh_ids = {score.id for score in fresh}
+            for position, score in enumerate(best, 1):
+                if score.id in fresh_ids:
+                    new_plays.append((user, score, position))
+
+        return (play_count, cursor, now, now, now + poll_interval(0), osu_user_id), new_plays
+
+    def stats(self):
+        return {"checked": self.checked, "api_calls": self.api_calls, "announced": self.announced}
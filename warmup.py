@@ -0,0 +1,177 @@
+import argparse
+import hashlib
+import os
+import re
+import tarfile
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import rosu_pp_py
+
+from utils.beatmap_cache import BEATMAP_CACHE_DIR, BEATMAP_CACHE_MAX_MB, BeatmapCache
+from utils.difficulty_cache import DifficultyCache
+from utils.pp_service import RULESETS, difficulty_values
+
+# 배포 직후 캐시가 비어서 ?rs가 전부 osu.ppy.sh로 가는 걸 막기 위한 캐시 미리 채우기 도구
+# .osu 파일 폴더나 tar/zip 묶음(데이터 덤프 등)을 읽어서
+#   - .osu 파일 디스크 캐시 (beatmap_cache/)
+#   - 자주 쓰는 모드 조합의 난이도 속성 (osu_bot.db의 difficulty_attributes)
+# 를 채운다. 난이도 속성이 이미 들어있는 맵(같은 체크섬 + 모든 모드 조합)은 .osu 파일이 캐시에 남아있는지와 상관없이
+# 건너뛰므로 중간에 멈춰도 다시 돌리면 이어서 한다.
+# - 봇은 시작할 때 한 번만 캐시 폴더를 읽으므로 봇을 띄우기 전에 돌린다 (돌던 봇은 재시작해야 새 파일을 본다)
+# - .osu 파일 캐시는 --max-mb(기본: 봇과 같은 BEATMAP_CACHE_MAX_MB)를 넘으면 먼저 넣은 파일부터 지워진다.
+#   덤프 전체를 남기려면 --max-mb와 봇의 BEATMAP_CACHE_MAX_MB를 덤프보다 크게 같은 값으로 맞춘다
+#   (봇의 값이 더 작으면 봇이 다음에 파일을 받을 때 넘치는 만큼 지운다)
+#   python warmup.py osu_files/
+#   python warmup.py dump.tar.bz2 --mods NM HD HR DT HDDT HDHR --workers 8 --max-mb 4096
+MOD_BITS = {"NM": 0, "NF": 1, "EZ": 2, "HD": 8, "HR": 16, "DT": 64, "HT": 256, "FL": 1024}
+DEFAULT_MODS = ("NM", "HD", "HR", "DT", "HDDT", "HDHR")
+BATCH_SIZE = 200          # 이 개수마다 DB에 한 번에 저장
+REPORT_SECONDS = 5
+
+BEATMAP_ID_PATTERN = re.compile(rb"^BeatmapID\s*:\s*(\d+)", re.MULTILINE)
+
+
+def parse_mods(name):
+    if name == "NM":
+        return 0
+    acronyms = [name[i:i + 2] for i in range(0, len(name), 2)]
+    unknown = [acronym for acronym in acronyms if acronym not in MOD_BITS]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"알 수 없는 모드: {', '.join(unknown)}")
+    return sum(MOD_BITS[acronym] for acronym in acronyms)
+
+
+# [Metadata]의 BeatmapID, 없으면 파일 이름 ({id}.osu 또는 캐시 형식 {id}.{md5}.osu)
+def beatmap_id_of(name, data):
+    match = BEATMAP_ID_PATTERN.search(data)
+    if match and int(match.group(1)) > 0:
+        return int(match.group(1))
+    stem = os.path.basename(name).split(".")[0]
+    return int(stem) if stem.isdigit() else None
+
+
+# (파일 이름, bytes)를 하나씩 돌려준다
+def iter_osu_files(path):
+    if os.path.isdir(path):
+        for root, _, files in os.walk(path):
+            for filename in sorted(files):
+                if filename.endswith(".osu"):
+                    file_path = os.path.join(root, filename)
+                    with open(file_path, "rb") as f:
+                        yield file_path, f.read()
+    elif zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if info.filename.endswith(".osu") and not info.is_dir():
+                    yield info.filename, archive.read(info)
+    elif tarfile.is_tarfile(path):
+        with tarfile.open(path, "r:*") as archive:
+            for member in archive:
+                if member.isfile() and member.name.endswith(".osu"):
+                    yield member.name, archive.extractfile(member).read()
+    else:
+        raise SystemExit(f"폴더, zip, tar 파일만 읽을 수 있습니다: {path}")
+
+
+# ------------------------------------------
+# 워커 프로세스 쪽: 한 번 파싱해서 모든 모드 조합 계산
+# ------------------------------------------
+MODE_NAMES = {int(ruleset): name for name, ruleset in RULESETS.items()}
+
+
+# 맵 자체의 모드로만 계산한다 (컨버트 기록은 봇이 처음 볼 때 계산)
+def _compute(data, mods_list):
+    rosu_map = rosu_pp_py.Beatmap(bytes=data)
+    values = {mods: difficulty_values(rosu_pp_py.Difficulty(mods=mods).calculate(rosu_map)) for mods in mods_list}
+    return MODE_NAMES[int(rosu_map.mode)], values
+
+
+def run(args):
+    mods_list = sorted(set(args.mods))
+    beatmap_cache = BeatmapCache(args.cache_dir, max_bytes=args.max_mb * 1024 * 1024)
+    difficulty_cache = DifficultyCache(args.db)
+    done = difficulty_cache.complete_entries(mods_list)
+    print(f"모드 조합 {len(mods_list)}개, 이미 계산된 맵 {len(done)}개, 워커 {args.workers}개")
+
+    scanned = skipped = failed = stored = 0
+    warned_full = False
+    rows = []
+    start = last_report = time.perf_counter()
+
+    def report(final=False):
+        elapsed = time.perf_counter() - start
+        rate = scanned / elapsed if elapsed else 0
+        label = "완료" if final else "진행 중"
+        print(f"[{label}] 읽음 {scanned}  저장 {stored}  건너뜀 {skipped}  실패 {failed}  ({rate:,.0f} files/s, {elapsed:.1f}초)")
+
+    def collect(finished):
+        nonlocal failed, stored, warned_full
+        for future in finished:
+            beatmap_id, md5, data = pending.pop(future)
+            try:
+                mode, values = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"계산 실패 ({beatmap_id}): {e}")
+                continue
+            if not beatmap_cache.has(beatmap_id, md5):
+                beatmap_cache.put(beatmap_id, data)
+                if beatmap_cache.evicted and not warned_full:
+                    warned_full = True
+                    print(f"경고: 넣은 .osu 파일이 캐시 크기({args.max_mb}MB)를 넘어서 먼저 넣은 파일부터 지워집니다 "
+                          f"(난이도 속성은 남음). 파일까지 남기려면 --max-mb를 늘리세요.")
+            rows.extend((beatmap_id, mode, mods, md5, attrs) for mods, attrs in values.items())
+            stored += 1
+        if len(rows) >= BATCH_SIZE * len(mods_list):
+            difficulty_cache.put_many(rows)
+            rows.clear()
+
+    pending = {}
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        try:
+            for path in args.paths:
+                for name, data in iter_osu_files(path):
+                    scanned += 1
+                    beatmap_id = beatmap_id_of(name, data)
+                    if beatmap_id is None:
+                        skipped += 1
+                        continue
+                    md5 = hashlib.md5(data).hexdigest()
+                    # 같은 묶음 안에 중복으로 들어있거나 이전 실행에서 이미 끝낸 맵
+                    # (캐시 크기 때문에 파일이 지워졌어도 다시 넣지 않는다. 다시 넣으면 다른 파일이 또 밀려남)
+                    if (beatmap_id, md5) in done:
+                        skipped += 1
+                        continue
+                    done.add((beatmap_id, md5))
+
+                    # 메모리에 올려둘 작업 수를 워커 수의 몇 배로 제한
+                    if len(pending) >= args.workers * 4:
+                        finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        collect(finished)
+                    pending[executor.submit(_compute, data, mods_list)] = (beatmap_id, md5, data)
+
+                    if time.perf_counter() - last_report >= REPORT_SECONDS:
+                        last_report = time.perf_counter()
+                        report()
+
+            collect(wait(pending).done)
+        finally:
+            # Ctrl+C로 멈춰도 여기까지 계산한 값은 저장 (다음 실행은 여기서 이어감)
+            if rows:
+                difficulty_cache.put_many(rows)
+            difficulty_cache.close()
+
+    report(final=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=".osu 파일 묶음으로 비트맵/난이도 캐시 미리 채우기")
+    parser.add_argument("paths", nargs="+", help=".osu 파일 폴더, zip(.osz) 또는 tar(.tar.gz/.tar.bz2) 파일")
+    parser.add_argument("--mods", nargs="+", type=parse_mods, default=[parse_mods(name) for name in DEFAULT_MODS], help="계산할 모드 조합 (예: NM HD HR DT HDDT HDHR)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--db", default="osu_bot.db")
+    parser.add_argument("--cache-dir", default=BEATMAP_CACHE_DIR)
+    parser.add_argument("--max-mb", type=int, default=BEATMAP_CACHE_MAX_MB, help=".osu 파일 캐시 최대 크기 (MB, 봇의 BEATMAP_CACHE_MAX_MB와 맞출 것)")
+    run(parser.parse_args())